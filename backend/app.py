@@ -5,65 +5,104 @@ Production Retail Intelligence Platform with real-time ML inference
 
 import os
 import json
-import joblib
+import time
 import numpy as np
 import pandas as pd
 import requests
 from typing import List, Optional, Dict, Any
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, WebSocket, WebSocketDisconnect, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import func, desc
 import shap
-from datetime import datetime, timedelta
+from datetime import datetime
 import asyncio
 import logging
 from contextlib import asynccontextmanager
 
 # Import our database and data API
 from database import (
-    init_db, get_db, Product, Store, Event, Rule, AuditLog, MLScore,
+    init_db, get_db, get_async_db, Product, Store, Event, Rule, AuditLog, MLScore,
     EventType, RuleType, StorePlatform
 )
-from retail_data_api import RetailDataAPI
+from retail_data_api import AsyncRetailDataAPI, RetailDataAPI
+from dirty_tracker import dirty_items
+from feature_store import FeatureStore, feature_store, price_bucket_for
+from recalc_scheduler import RecalcScheduler
+from inference_executor import InferenceExecutor, StaleArtifactsError, worker_shap_values
+from tree_evaluator import CompiledForest, HybridPredictor, check_parity, sample_inputs
+from ranking_snapshot import ranking_snapshots
+from micro_batcher import MicroBatcher
+from model_registry import ModelArtifacts, artifact_fingerprint, model_registry, read_artifacts
+from audit_sink import audit_sink
+from product_cache import ProductSnapshot, product_cache
+from rule_engine import compile_rules
+from rules_index import rules_index
+from rollups import backfill_if_empty
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Global variables for ML artifacts
 model = None
+predictor = None  # Object whose .predict() scores feature rows (see INFERENCE_BACKEND)
 encoders = None
+lookups = {}  # Encoders compiled to array-backed lookup tables
 FEATURES = []
 explainer = None
 
+# Directory holding lightgbm_ranker.pkl, encoders.pkl and features.txt
+ARTIFACT_DIR = os.path.join(os.path.dirname(__file__), "..", "azureml")
+
 # WebSocket connections for real-time updates
 active_connections: List[WebSocket] = []
 
+# Clock bucket (year, month, weekday, hour) of the last full scoring pass
+scored_time_key = None
+
+# Re-score only products changed since the last pass (set "false" to always score everything)
+INCREMENTAL_RESCORING = os.getenv("INCREMENTAL_RESCORING", "true").lower() == "true"
+
+# Exact ranks for the best RANKING_TOP_K items; the tail gets bucketed ranks (0 = sort everything)
+RANKING_TOP_K = int(os.getenv("RANKING_TOP_K", "1000"))
+
+# Ranked rows per snapshot that carry event metrics (/rank serves the top 100)
+SNAPSHOT_METRICS_LIMIT = int(os.getenv("SNAPSHOT_METRICS_LIMIT", "100"))
+
+# Fields of a snapshot row returned by /rank
+RANK_FIELDS = ("item_id", "score", "rank", "rankChange", "views", "clicks", "revenue",
+               "category", "name", "imageUrl")
+
+# Scoring backend: "lightgbm", "numpy" (compiled trees) or "hybrid" (numpy for small batches)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "lightgbm").lower()
+NUMPY_MAX_BATCH = int(os.getenv("NUMPY_MAX_BATCH", "8"))
+
+# Poll ARTIFACT_DIR every MODEL_WATCH_INTERVAL seconds and hot-reload on change (0 = admin endpoint only)
+MODEL_WATCH_INTERVAL = float(os.getenv("MODEL_WATCH_INTERVAL", "0"))
+# Rows explained during warm-up of a new model (0 = whole catalog)
+MODEL_WARMUP_SHAP_ROWS = int(os.getenv("MODEL_WARMUP_SHAP_ROWS", "1000"))
+
+# Largest price sweep accepted by /whatif/price-curve
+WHATIF_MAX_POINTS = int(os.getenv("WHATIF_MAX_POINTS", "200"))
+
+# Queue non-critical audit entries on the write-behind sink ("false" = commit each entry inline)
+AUDIT_WRITE_BEHIND = os.getenv("AUDIT_WRITE_BEHIND", "true").lower() == "true"
+
+# Model inference runs here instead of on the event loop
+_inference_processes = int(os.getenv("INFERENCE_PROCESSES", "0"))
+inference_executor = InferenceExecutor(
+    threads=int(os.getenv("INFERENCE_THREADS", "4")),
+    max_concurrency=int(os.getenv("INFERENCE_MAX_CONCURRENCY", "0")) or None,
+    processes=_inference_processes,
+)
+
 
 def load_ml_artifacts():
     """Load ML models and artifacts at startup"""
-    global model, encoders, FEATURES, explainer
-    
-    base_path = os.path.join(os.path.dirname(__file__), "..", "azureml")
-    
     try:
-        # Load model
-        model_path = os.path.join(base_path, "lightgbm_ranker.pkl")
-        model = joblib.load(model_path)
-        logger.info(f"[OK] Loaded model from {model_path}")
-        
-        # Load encoders
-        encoders_path = os.path.join(base_path, "encoders.pkl")
-        encoders = joblib.load(encoders_path)
-        logger.info(f"[OK] Loaded encoders from {encoders_path}")
-        
-        # Load features
-        features_path = os.path.join(base_path, "features.txt")
-        with open(features_path, "r") as f:
-            FEATURES = [line.strip() for line in f.readlines()]
-        logger.info(f"[OK] Loaded {len(FEATURES)} features from {features_path}")
-        
+        activate_model(build_artifacts(ARTIFACT_DIR))
         logger.info("[OK] ML artifacts loaded successfully")
         
     except Exception as e:
@@ -71,16 +110,91 @@ def load_ml_artifacts():
         raise
 
 
+def build_artifacts(artifact_dir: str) -> ModelArtifacts:
+    """Load an artifact set from disk and pick its scoring backend (not yet active)"""
+    fingerprint = artifact_fingerprint(artifact_dir)
+    new_model, new_encoders, new_lookups, new_features = read_artifacts(artifact_dir)
+    return ModelArtifacts(
+        version=model_registry.next_version(),
+        model=new_model,
+        predictor=select_predictor(new_model),
+        encoders=new_encoders,
+        lookups=new_lookups,
+        features=new_features,
+        source=os.path.abspath(artifact_dir),
+        fingerprint=fingerprint,
+    )
+
+
+def activate_model(artifacts: ModelArtifacts):
+    """Swap an artifact set into the module globals read by every scoring path
+    
+    All globals are reassigned together with no await in between, so a
+    coroutine never sees a mixed set. Returns the replaced set.
+    """
+    replaced = model_registry.activate(artifacts)
+    install_artifacts(artifacts, replaced)
+    return replaced
+
+
+def install_artifacts(artifacts: ModelArtifacts, replaced: Optional[ModelArtifacts]):
+    """Point the module globals (and feature store encoding) at an artifact set"""
+    global model, predictor, encoders, lookups, FEATURES, explainer
+    
+    model = artifacts.model
+    predictor = artifacts.predictor
+    encoders = artifacts.encoders
+    lookups = artifacts.lookups
+    FEATURES = artifacts.features
+    explainer = artifacts.explainer
+    
+    # Resident rows stay valid unless the feature list or encoder classes changed
+    if not artifacts.same_schema(replaced):
+        feature_store.configure(FEATURES, lookups)
+        if replaced is not None:
+            load_feature_store()
+    
+    logger.info(f"[OK] Model version {artifacts.version} active ({artifacts.source})")
+
+
+def select_predictor(model):
+    """Build the scoring backend named by INFERENCE_BACKEND"""
+    if INFERENCE_BACKEND not in ("numpy", "hybrid"):
+        return model
+    
+    try:
+        forest = CompiledForest.from_model(model)
+        diff = check_parity(forest, model, sample_inputs(model))
+        logger.info(f"[OK] Compiled {forest.num_trees} trees for NumPy inference (parity {diff:.2g})")
+    except Exception as e:
+        logger.warning(f"NumPy tree evaluator unavailable, using LightGBM: {e}")
+        return model
+    
+    if INFERENCE_BACKEND == "numpy":
+        return forest
+    return HybridPredictor(forest, model, max_batch=NUMPY_MAX_BATCH)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup and shutdown lifecycle"""
     # Startup
     logger.info("Starting ReSight API...")
     init_db()  # Initialize database
+    load_rollups()  # Backfill rollups on first start after upgrading
     load_ml_artifacts()  # Load ML models
+    load_feature_store()  # Build resident feature matrix
+    load_rules_index()  # Resident rules lookup
     
     # Start background tasks
+    recalc_scheduler.start()
+    asyncio.create_task(expire_rules())
+    if AUDIT_WRITE_BEHIND:
+        from database import SessionLocal
+        audit_sink.start(SessionLocal)
     asyncio.create_task(background_ml_scoring())
+    if MODEL_WATCH_INTERVAL > 0:
+        asyncio.create_task(watch_model_artifacts())
     
     # Start mock event generator (runs only if no stores connected)
     try:
@@ -94,6 +208,9 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down ReSight API...")
+    await recalc_scheduler.stop()
+    await asyncio.to_thread(audit_sink.stop)  # Flush queued audit entries
+    inference_executor.shutdown()
 
 
 # Initialize FastAPI app
@@ -115,86 +232,208 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Ranking-Version", "X-Ranking-Age"],
 )
 
 
-async def recalc_rankings_with_db(db: Session, data_api: RetailDataAPI):
+def load_feature_store():
+    """Encode the whole catalog into the resident feature store
+    
+    Also drops the product cache, so writes from other processes reach
+    /item and /explain on the same reload as the feature rows.
+    """
+    from database import SessionLocal
+    db = SessionLocal()
+    try:
+        feature_store.load(RetailDataAPI(db).get_all_products(active_only=False))
+        product_cache.clear()
+    finally:
+        db.close()
+
+
+def load_rollups():
+    """Build rollups from existing events if the rollups table is still empty"""
+    from database import SessionLocal
+    db = SessionLocal()
+    try:
+        backfill_if_empty(db)
+    finally:
+        db.close()
+
+
+def load_rules_index():
+    """Load all rules into the resident rules index"""
+    from database import SessionLocal
+    db = SessionLocal()
+    try:
+        rules_index.load(db.query(Rule).all())
+    finally:
+        db.close()
+
+
+def product_features(product: Product, now: datetime) -> Dict:
+    """Build the raw (unencoded) feature dict for one product"""
+    return {
+        "item_id": product.item_id,
+        "price": product.price,
+        "stock": product.stock,
+        "verified_purchase": product.verified_purchase or 0.0,
+        "helpful_votes": product.helpful_votes or 0,
+        "avg_rating": product.avg_rating or 0.0,
+        "rating_count": product.rating_count or 0,
+        "year": now.year,
+        "month": now.month,
+        "day_of_week": now.weekday(),
+        "hour": now.hour,
+        "recency_weight": 0.8,
+        "category": product.category,
+        "region": product.region or "IN",
+        "store": product.store.name if product.store else "online",
+        "main_category": product.main_category or product.category,
+        "popularity_bucket": product.popularity_bucket or "medium",
+        "price_bucket": product.price_bucket or "mid",
+    }
+
+
+async def recalc_rankings_with_db(db: AsyncSession, data_api: AsyncRetailDataAPI, full: bool = False):
     """
     Real-time ranking recalculation
     Called after: Webhook, Mock event, Rule change, What-If
+    
+    Features come from the resident feature_store. Only rows flagged in
+    dirty_items since the last pass (plus any never-scored rows) are
+    re-predicted; a full pass runs on demand, on the first call and whenever
+    the hour rolls over (the time features shift every product's score).
     """
+    global scored_time_key
+    
     if model is None:
         logger.warning("Model not loaded, skipping ranking recalculation")
         return
     
+    full_pass, dirty = dirty_items.drain()
+    
     try:
-        # Get all products
-        products = data_api.get_all_products(active_only=True)
+        now = datetime.utcnow()
+        time_key = (now.year, now.month, now.weekday(), now.hour)
+        full_pass = (full or full_pass or not INCREMENTAL_RESCORING
+                     or time_key != scored_time_key)
         
-        if not products:
-            return
+        if full_pass:
+            item_ids, X = feature_store.matrix(now)
+        else:
+            # Dirty items that went out of stock simply drop out of the active rows
+            item_ids, X = feature_store.matrix(now, item_ids=dirty | set(feature_store.unscored()))
         
-        # Prepare features
-        items_data = []
-        now = datetime.utcnow()
+        # Score changed rows with ML
+        if item_ids:
+            scores = await inference_executor.run("rank", predictor.predict, X)
+            feature_store.set_scores(item_ids, scores)
         
-        for product in products:
-            item_dict = {
-                "item_id": product.item_id,
-                "price": product.price,
-                "stock": product.stock,
-                "verified_purchase": product.verified_purchase or 0.0,
-                "helpful_votes": product.helpful_votes or 0,
-                "avg_rating": product.avg_rating or 0.0,
-                "rating_count": product.rating_count or 0,
-                "year": now.year,
-                "month": now.month,
-                "day_of_week": now.weekday(),
-                "hour": now.hour,
-                "recency_weight": 0.8,
-                "category": product.category,
-                "region": product.region or "IN",
-                "store": product.store.name if product.store else "online",
-                "main_category": product.main_category or product.category,
-                "popularity_bucket": product.popularity_bucket or "medium",
-                "price_bucket": product.price_bucket or "mid",
-            }
-            items_data.append(item_dict)
+        scored_time_key = time_key
         
-        # Score with ML
-        X, df = prepare_features(items_data)
-        scores = model.predict(X)
+        ranked_ids, ranked_scores = feature_store.scored(active_only=True)
+        if not ranked_ids:
+            return
         
-        # Create scored items
-        scored_items = []
-        for idx, item in enumerate(items_data):
-            scored_items.append({
-                "item_id": item["item_id"],
-                "score": float(scores[idx]),
-            })
+        # Create scored items from the merged score column
+        scored_items = [
+            {"item_id": item_id, "score": float(score)}
+            for item_id, score in zip(ranked_ids, ranked_scores)
+        ]
         
-        # Apply rules
-        scored_items = data_api.apply_rules_to_scores(scored_items)
+        # Apply rules (partial ranking: exact head, bucketed tail)
+        scored_items = await data_api.apply_rules_to_scores(scored_items, top_k=RANKING_TOP_K or None)
         
         # Update ML scores cache
-        data_api.update_ml_scores(scored_items)
+        await data_api.update_ml_scores(scored_items)
+        
+        # Publish the in-memory snapshot served by /rank, /item and the WebSocket
+        snapshot = await publish_ranking_snapshot(data_api, scored_items)
         
         # Broadcast to WebSocket clients
-        await broadcast_kpi_update(data_api)
+        await broadcast_kpi_update(snapshot)
         
-        logger.info(f"[OK] Recalculated rankings for {len(scored_items)} products")
+        logger.info(
+            f"[OK] Recalculated rankings for {len(scored_items)} products "
+            f"({len(item_ids)} re-scored, {'full' if full_pass else 'incremental'})"
+        )
         
     except Exception as e:
         logger.error(f"Error in ranking recalculation: {e}")
+        # Scores may be half-merged; make the next pass start from scratch
+        dirty_items.mark_all()
         raise
 
 
+async def score_request_batch(X):
+    """Score a merged micro-batch of request-time feature rows"""
+    return await inference_executor.run("rank_request", predictor.predict, X)
+
+
+# Concurrent /rank calls with candidate items share one predict call
+rank_batcher = MicroBatcher(
+    score_request_batch,
+    window_ms=float(os.getenv("RANK_BATCH_WINDOW_MS", "5")),
+    max_batch=int(os.getenv("RANK_MAX_BATCH", "2048")),
+)
+
+
+async def publish_ranking_snapshot(data_api: AsyncRetailDataAPI, scored_items: List[Dict]):
+    """Build the next ranking snapshot from ranked items and swap it in"""
+    previous = ranking_snapshots.current()
+    rows = []
+    
+    # Event metrics only for the rows /rank serves; /item falls back to the DB for the rest
+    metrics_by_id = await data_api.get_products_metrics(
+        [item["item_id"] for item in scored_items[:SNAPSHOT_METRICS_LIMIT]]
+    )
+    
+    for item in scored_items:
+        item_id = item["item_id"]
+        info = feature_store.info(item_id) or {}
+        prev = previous.get(item_id)
+        metrics = metrics_by_id.get(item_id)
+        
+        rows.append({
+            "item_id": item_id,
+            "score": item["score"],
+            "rank": item["rank"],
+            "pinned": item.get("pinned", False),
+            "pin_priority": item.get("pin_priority", 0.0),
+            "rankChange": (prev["rank"] - item["rank"]) if prev else 0,
+            "views": metrics["views"] if metrics else 0,
+            "clicks": metrics["clicks"] if metrics else 0,
+            "revenue": metrics["revenue"] if metrics else 0,
+            "category": info.get("category"),
+            "name": info.get("title"),
+            "imageUrl": info.get("image_url"),
+            "price": info.get("price"),
+            "stock": info.get("stock"),
+            "brand": info.get("brand"),
+            "metrics": metrics,
+        })
+    
+    kpis = await data_api.get_global_kpis()
+    return ranking_snapshots.publish(rows, kpis=kpis)
+
+
+async def run_scheduled_recalc(full: bool = False):
+    """Recalculation entry point for the scheduler (uses its own session)"""
+    from database import AsyncSessionLocal
+    async with AsyncSessionLocal() as db:
+        await recalc_rankings_with_db(db, AsyncRetailDataAPI(db), full=full)
+
+
+# Webhooks signal the scheduler; bursts inside the window collapse into one pass
+recalc_scheduler = RecalcScheduler(
+    run_scheduled_recalc,
+    window_ms=float(os.getenv("RECALC_COALESCE_MS", "250"))
+)
+
+
 async def background_ml_scoring():
     """Background task: Score all products every 30 seconds"""
-    from database import SessionLocal
-    db = SessionLocal()
-    data_api = RetailDataAPI(db)
-    
     while True:
         try:
             await asyncio.sleep(30)  # Run every 30 seconds
@@ -203,25 +442,38 @@ async def background_ml_scoring():
             if model is None:
                 continue
             
-            # Use shared recalculation function
-            if model:
-                await recalc_rankings_with_db(db, data_api)
+            # Pick up product writes that bypassed RetailDataAPI (scripts, other instances)
+            await asyncio.to_thread(load_feature_store)
+            
+            # Full pass through the scheduler (never overlaps a webhook-driven pass)
+            await recalc_scheduler.run_now(full=True)
             
         except Exception as e:
             logger.error(f"Error in background ML scoring: {e}")
             await asyncio.sleep(30)
-        finally:
-            db.close()
 
 
-async def broadcast_kpi_update(data_api: RetailDataAPI):
-    """Broadcast KPI updates to all WebSocket clients"""
-    if not active_connections:
+async def expire_rules():
+    """Background task: evict rules at expires_at and re-rank (no re-prediction)"""
+    while True:
+        await asyncio.sleep(rules_index.tick)
+        try:
+            expired = rules_index.expire()
+            if expired:
+                # Rules do not change raw scores: a pass with nothing dirty only re-applies rules
+                recalc_scheduler.signal()
+                logger.info(f"[OK] {len(expired)} rules expired")
+        except Exception as e:
+            logger.error(f"Error expiring rules: {e}")
+
+
+async def broadcast_kpi_update(snapshot):
+    """Broadcast KPI updates from a ranking snapshot to all WebSocket clients"""
+    if not active_connections or snapshot.kpis is None:
         return
     
     try:
-        kpis = data_api.get_global_kpis()
-        message = json.dumps({"type": "kpi_update", "data": kpis})
+        message = json.dumps({"type": "kpi_update", "data": dict(snapshot.kpis), "version": snapshot.version})
         
         # Send to all connected clients
         disconnected = []
@@ -243,15 +495,10 @@ def prepare_features(items: List[Dict]) -> tuple:
     """Prepare features for model inference"""
     df = pd.DataFrame(items)
     
-    # Encode categorical features
-    for col, encoder in encoders.items():
+    # Encode categorical features (unseen labels get UNKNOWN_CODE row by row)
+    for col, lookup in lookups.items():
         if col in df.columns:
-            df[col] = df[col].fillna("").astype(str)
-            try:
-                df[col] = encoder.transform(df[col])
-            except Exception as e:
-                logger.warning(f"Encoder failed for {col}: {e}")
-                df[col] = 0
+            df[col] = lookup.encode(df[col].fillna("").astype(str).to_numpy())
     
     # Ensure all required features are present
     for feat in FEATURES:
@@ -263,6 +510,186 @@ def prepare_features(items: List[Dict]) -> tuple:
     return X, df
 
 
+def item_feature_row(product: ProductSnapshot, now: datetime):
+    """Encoded (1, n_features) row for a product, read from the feature store"""
+    X = feature_store.row(product.item_id, now)
+    if X is None:
+        # Not resident yet (e.g. written by another process); encode on the fly
+        X, _ = prepare_features([product_features(product, now)])
+    return X
+
+
+def get_explainer():
+    """Lazily build the SHAP explainer for the loaded model"""
+    global explainer
+    if explainer is None and model is not None:
+        explainer = shap.TreeExplainer(model)
+        model_registry.current().explainer = explainer
+    return explainer
+
+
+async def compute_shap_values(X):
+    """SHAP values on the inference executor (process pool when configured)"""
+    current = model_registry.current()
+    if inference_executor.has_process_pool:
+        # Workers load the active version from its artifact directory on first use
+        try:
+            return await inference_executor.run(
+                "explain", worker_shap_values, X, current.version, current.source, current.fingerprint,
+                cpu_bound=True,
+            )
+        except StaleArtifactsError:
+            pass  # Files replaced since this version was loaded (e.g. after a rollback)
+    return await inference_executor.run("explain", get_explainer().shap_values, X)
+
+
+def warm_up_artifacts(artifacts: ModelArtifacts, now: datetime) -> Dict:
+    """Score the active catalog and run a SHAP pass with a not-yet-active artifact set
+    
+    Raises if the new model cannot score the catalog, so a broken artifact
+    set is never swapped in. Runs on the inference executor.
+    """
+    from database import SessionLocal
+    
+    # Encode with the new feature list and encoders, aside from the live store
+    store = FeatureStore()
+    store.configure(artifacts.features, artifacts.lookups)
+    db = SessionLocal()
+    try:
+        store.load(RetailDataAPI(db).get_all_products(active_only=True))
+    finally:
+        db.close()
+    item_ids, X = store.matrix(now)
+    
+    started = time.perf_counter()
+    scores = np.asarray(artifacts.predictor.predict(X)) if item_ids else np.empty(0)
+    score_ms = (time.perf_counter() - started) * 1000
+    if len(scores) != len(item_ids) or not np.all(np.isfinite(scores)):
+        raise ValueError("Warm-up scoring returned missing or non-finite scores")
+    
+    started = time.perf_counter()
+    artifacts.explainer = shap.TreeExplainer(artifacts.model)
+    shap_rows = X[:MODEL_WARMUP_SHAP_ROWS] if MODEL_WARMUP_SHAP_ROWS else X
+    if len(shap_rows):
+        artifacts.explainer.shap_values(shap_rows)
+    shap_ms = (time.perf_counter() - started) * 1000
+    
+    artifacts.warmup = {
+        "items": len(item_ids),
+        "scoreMs": round(score_ms, 1),
+        "shapRows": len(shap_rows),
+        "shapMs": round(shap_ms, 1),
+    }
+    return artifacts.warmup
+
+
+# Serializes reloads and rollbacks
+model_reload_lock = asyncio.Lock()
+
+
+async def reload_model(artifact_dir: str = ARTIFACT_DIR) -> ModelArtifacts:
+    """Load and warm a new artifact set in the background, then swap it in
+    
+    The serving model keeps answering requests until the swap; on any
+    failure it stays active.
+    """
+    async with model_reload_lock:
+        try:
+            artifacts = await inference_executor.run("model_load", build_artifacts, artifact_dir)
+            await inference_executor.run("model_warmup", warm_up_artifacts, artifacts, datetime.utcnow())
+        except Exception as e:
+            model_registry.record_failure(e)
+            logger.error(f"Model reload from {artifact_dir} failed, keeping current model: {e}")
+            raise
+        activate_model(artifacts)
+    
+    # Re-rank the catalog with the new model (ml_scores keeps the old ranking until then)
+    await recalc_scheduler.run_now(full=True)
+    return artifacts
+
+
+async def rollback_model() -> ModelArtifacts:
+    """Swap the previously active artifact set back in"""
+    async with model_reload_lock:
+        restored = model_registry.rollback()
+        install_artifacts(restored, model_registry.previous())
+    await recalc_scheduler.run_now(full=True)
+    return restored
+
+
+async def watch_model_artifacts():
+    """Hot-reload when the files in ARTIFACT_DIR change
+    
+    A change is picked up once the fingerprint is stable for one interval,
+    so a reload never reads a half-copied artifact set.
+    """
+    seen = model_registry.current().fingerprint
+    candidate = None
+    while True:
+        await asyncio.sleep(MODEL_WATCH_INTERVAL)
+        fingerprint = artifact_fingerprint(ARTIFACT_DIR)
+        if fingerprint == seen:
+            candidate = None
+            continue
+        if fingerprint != candidate:
+            candidate = fingerprint  # Still being written; check again next tick
+            continue
+        seen, candidate = fingerprint, None
+        try:
+            logger.info(f"Model artifacts changed in {ARTIFACT_DIR}, reloading...")
+            await reload_model()
+        except Exception:
+            pass  # Logged by reload_model; wait for the next change
+
+
+def price_variant_rows(product: ProductSnapshot, prices: List[float], now: datetime) -> np.ndarray:
+    """The product's encoded feature row followed by one copy per price
+    (price and price_bucket re-derived for each)"""
+    X = np.repeat(np.asarray(item_feature_row(product, now), dtype=np.float64), len(prices) + 1, axis=0)
+    X[1:, feature_store.column("price")] = prices
+    X[1:, feature_store.column("price_bucket")] = [
+        feature_store.encode_value("price_bucket", price_bucket_for(price)) for price in prices
+    ]
+    return X
+
+
+async def whatif_price_ranks(product: ProductSnapshot, prices: List[float]) -> Dict:
+    """Scores and ranks of one product at each price, against the current ranking snapshot
+    
+    Only this product is re-scored (one predict call for its current row
+    plus every variant); all other products keep their snapshot scores, so
+    each rank is a binary search over the snapshot's sorted scores.
+    """
+    snapshot = ranking_snapshots.current()
+    X = price_variant_rows(product, prices, datetime.utcnow())
+    raw = np.asarray(await inference_executor.run("whatif", predictor.predict, X), dtype=np.float64)
+    
+    rules = compile_rules(rules_index.for_item(product.item_id, product.category),
+                          [product.item_id], [product.category])
+    pinned = bool(rules.pinned[0])
+    priority = float(rules.pin_priority[0])
+    row = snapshot.get(product.item_id)
+    own_score = row["score"] if row is not None and bool(row.get("pinned")) == pinned else None
+    if own_score is not None:
+        # Shift the published score by the model's delta, so scores stay comparable
+        scores = own_score + (raw[1:] - raw[0]) * rules.multiplier[0]
+    else:
+        scores = raw[1:] * rules.multiplier[0]
+    # Exact rank of the current score, found the same way as the new ranks: the
+    # published rank is bucketed past RANKING_TOP_K and would fake a rank change
+    if row is not None:
+        old_rank = snapshot.rank_of(row["score"], bool(row.get("pinned")), row.get("pin_priority", 0.0), own=row)
+    else:
+        old_rank = len(snapshot) + 1
+    
+    if rules.removed[0] or (product.stock or 0) <= 0:
+        # Removed and out-of-stock items are never ranked
+        ranks = np.full(len(prices), len(snapshot) + 1, dtype=np.int64)
+    else:
+        ranks = snapshot.rank_of(scores, pinned, priority, own=row)
+    return {"oldRank": int(old_rank), "scores": scores, "ranks": ranks, "version": snapshot.version}
+
+
 # Request/Response Models
 
 class RankRequest(BaseModel):
@@ -275,6 +702,15 @@ class WhatIfPriceRequest(BaseModel):
     newPrice: float
 
 
+class WhatIfPriceCurveRequest(BaseModel):
+    itemId: str
+    # Explicit price points, or an evenly spaced range; bounded before any list is built
+    prices: Optional[List[float]] = Field(None, max_length=WHATIF_MAX_POINTS)
+    minPrice: Optional[float] = Field(None, ge=0)
+    maxPrice: Optional[float] = Field(None, ge=0)
+    points: int = Field(50, ge=2, le=WHATIF_MAX_POINTS)
+
+
 class PinRuleRequest(BaseModel):
     itemId: str
     created_by: Optional[str] = "system"
@@ -285,6 +721,18 @@ class BoostClearanceRequest(BaseModel):
     created_by: Optional[str] = "system"
 
 
+class BulkRuleRequest(BaseModel):
+    ruleType: str  # pin, boost, demote, remove
+    strength: float = 1.0
+    category: Optional[str] = None
+    itemIds: Optional[List[str]] = None
+    inStockOnly: bool = False
+    expiresAt: Optional[datetime] = None
+    updateExisting: bool = False
+    categoryScope: bool = False  # One category rule instead of one rule per item
+    created_by: Optional[str] = "system"
+
+
 class MarketplaceWebhook(BaseModel):
     item_id: str
     title: Optional[str] = None
@@ -297,6 +745,10 @@ class MarketplaceWebhook(BaseModel):
     metadata: Optional[Dict] = None
 
 
+class ModelAdminRequest(BaseModel):
+    created_by: Optional[str] = "system"
+
+
 class AskAIRequest(BaseModel):
     question: str
     context: Dict[str, Any]
@@ -317,29 +769,125 @@ async def root():
 
 
 @app.get("/metrics")
-async def get_metrics(db: Session = Depends(get_db)):
-    """Get real-time KPI metrics"""
-    data_api = RetailDataAPI(db)
-    return data_api.get_global_kpis()
+async def get_metrics(window: str = "30d", db: AsyncSession = Depends(get_async_db)):
+    """Get real-time KPI metrics (window: 24h, 7d or 30d) with prior-period changes"""
+    data_api = AsyncRetailDataAPI(db)
+    try:
+        return await data_api.get_global_kpis(window)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/metrics/recalc")
+async def get_recalc_metrics():
+    """Recalculation scheduler metrics (queue depth, coalescing ratio)"""
+    return recalc_scheduler.stats()
+
+
+@app.get("/metrics/inference")
+async def get_inference_metrics():
+    """Inference executor metrics (per-job timings, concurrency)"""
+    return {**inference_executor.stats(), "rankBatcher": rank_batcher.stats()}
+
+
+@app.get("/metrics/audit")
+async def get_audit_metrics():
+    """Write-behind audit sink metrics (queue depth, batches, failures)"""
+    return audit_sink.stats()
+
+
+@app.get("/metrics/product-cache")
+async def get_product_cache_metrics():
+    """Product snapshot cache metrics (size, hit rate, evictions)"""
+    return product_cache.stats()
+
+
+@app.get("/metrics/rules")
+async def get_rules_metrics():
+    """Rules index metrics (active rules, scheduled expiries)"""
+    return rules_index.stats()
 
 
 @app.post("/rank")
-async def rank_items(request: RankRequest, db: Session = Depends(get_db)):
+async def rank_items(request: RankRequest, response: Response, db: AsyncSession = Depends(get_async_db)):
     """Get ranked product recommendations"""
     if model is None:
         raise HTTPException(status_code=500, detail="Model not loaded")
     
-    data_api = RetailDataAPI(db)
+    # Score a caller-supplied candidate list on demand
+    if request.items:
+        return await score_candidate_items(request.items, AsyncRetailDataAPI(db))
+    
+    # Serve the latest published snapshot (no database round trip)
+    snapshot = ranking_snapshots.current()
+    if snapshot.version == 0:
+        # Nothing published yet; read the persisted ranking
+        return await AsyncRetailDataAPI(db).get_ranked_products(limit=100)
     
-    # Get cached ranked products (computed by background task)
-    recommendations = data_api.get_ranked_products(limit=100)
+    response.headers["X-Ranking-Version"] = str(snapshot.version)
+    response.headers["X-Ranking-Age"] = f"{snapshot.age_seconds:.3f}"
     
-    return recommendations
+    return [{key: row[key] for key in RANK_FIELDS} for row in snapshot.items[:100]]
+
+
+async def score_candidate_items(items: List[Dict], data_api: AsyncRetailDataAPI) -> List[Dict]:
+    """Score and rank RankRequest.items through the micro-batcher"""
+    items = [item for item in items if item.get("item_id")]
+    if not items:
+        return []
+    
+    try:
+        X = feature_store.compose(items, datetime.utcnow())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    scores = await rank_batcher.score(X)
+    
+    scored_items = [
+        {"item_id": item["item_id"], "score": float(score)}
+        for item, score in zip(items, scores)
+    ]
+    scored_items = await data_api.apply_rules_to_scores(scored_items)
+    
+    snapshot = ranking_snapshots.current()
+    results = []
+    for item in scored_items:
+        info = feature_store.info(item["item_id"]) or {}
+        row = snapshot.get(item["item_id"])
+        results.append({
+            "item_id": item["item_id"],
+            "score": item["score"],
+            "rank": item["rank"],
+            "rankChange": 0,
+            "views": row["views"] if row else 0,
+            "clicks": row["clicks"] if row else 0,
+            "revenue": row["revenue"] if row else 0,
+            "category": info.get("category"),
+            "name": info.get("title"),
+            "imageUrl": info.get("image_url"),
+        })
+    return results
 
 
 @app.get("/item/{item_id}")
 async def get_item(item_id: str, db: Session = Depends(get_db)):
     """Get detailed item information with ML score and metrics"""
+    # Ranked items with metrics are served straight from the snapshot
+    row = ranking_snapshots.current().get(item_id)
+    if row is not None and row["metrics"] is not None:
+        return {
+            "item_id": row["item_id"],
+            "title": row["name"],
+            "category": row["category"],
+            "price": row["price"],
+            "stock": row["stock"],
+            "score": row["score"],
+            "rank": row["rank"],
+            "rankChange": row["rankChange"],
+            "metrics": dict(row["metrics"]),
+            "image_url": row["imageUrl"],
+            "brand": row["brand"],
+        }
+    
     data_api = RetailDataAPI(db)
     
     # Get product
@@ -380,36 +928,11 @@ async def explain_item(item_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail=f"Item {item_id} not found")
     
     # Prepare features
-    now = datetime.utcnow()
-    item_dict = {
-        "item_id": product.item_id,
-        "price": product.price,
-        "stock": product.stock,
-        "verified_purchase": product.verified_purchase or 0.0,
-        "helpful_votes": product.helpful_votes or 0,
-        "avg_rating": product.avg_rating or 0.0,
-        "rating_count": product.rating_count or 0,
-        "year": now.year,
-        "month": now.month,
-        "day_of_week": now.weekday(),
-        "hour": now.hour,
-        "recency_weight": 0.8,
-        "category": product.category,
-        "region": product.region or "IN",
-        "store": product.store.name if product.store else "online",
-        "main_category": product.main_category or product.category,
-        "popularity_bucket": product.popularity_bucket or "medium",
-        "price_bucket": product.price_bucket or "mid",
-    }
-    
-    X, _ = prepare_features([item_dict])
+    X = item_feature_row(product, datetime.utcnow())
     
     # Compute SHAP values
     try:
-        global explainer
-        if explainer is None:
-            explainer = shap.TreeExplainer(model)
-        shap_values = explainer.shap_values(X)
+        shap_values = await compute_shap_values(X)
         
         # Convert to dictionary
         if len(shap_values.shape) == 1:
@@ -438,68 +961,20 @@ async def explain_item(item_id: str, db: Session = Depends(get_db)):
 
 
 @app.post("/whatif/price")
-async def whatif_price(request: WhatIfPriceRequest, db: Session = Depends(get_db)):
+async def whatif_price(request: WhatIfPriceRequest, db: AsyncSession = Depends(get_async_db)):
     """Simulate price change impact on ranking"""
     if model is None:
         raise HTTPException(status_code=500, detail="Model not loaded")
     
-    data_api = RetailDataAPI(db)
-    product = data_api.get_product_by_id(request.itemId)
+    data_api = AsyncRetailDataAPI(db)
+    product = await data_api.get_product_by_id(request.itemId)
     if not product:
         raise HTTPException(status_code=404, detail=f"Item {request.itemId} not found")
     
-    # Get all products
-    all_products = data_api.get_all_products(active_only=True)
-    
-    # Current ranking
-    current_scores = data_api.get_ranked_products()
-    current_item = next((item for item in current_scores if item["item_id"] == request.itemId), None)
-    current_rank = current_item["rank"] if current_item else len(current_scores) + 1
-    
-    # Create modified product
-    now = datetime.utcnow()
-    items_data = []
-    for p in all_products:
-        item_dict = {
-            "item_id": p.item_id,
-            "price": request.newPrice if p.item_id == request.itemId else p.price,
-            "stock": p.stock,
-            "verified_purchase": p.verified_purchase or 0.0,
-            "helpful_votes": p.helpful_votes or 0,
-            "avg_rating": p.avg_rating or 0.0,
-            "rating_count": p.rating_count or 0,
-            "year": now.year,
-            "month": now.month,
-            "day_of_week": now.weekday(),
-            "hour": now.hour,
-            "recency_weight": 0.8,
-            "category": p.category,
-            "region": p.region or "IN",
-            "store": p.store.name if p.store else "online",
-            "main_category": p.main_category or p.category,
-            "popularity_bucket": p.popularity_bucket or "medium",
-            "price_bucket": "budget" if request.newPrice < 50 else ("mid" if request.newPrice < 150 else "premium") if p.item_id == request.itemId else (p.price_bucket or "mid"),
-        }
-        items_data.append(item_dict)
-    
-    # Score with new price
-    X, df = prepare_features(items_data)
-    scores = model.predict(X)
-    
-    scored_items = []
-    for idx, item in enumerate(items_data):
-        scored_items.append({
-            "item_id": item["item_id"],
-            "score": float(scores[idx]),
-        })
-    
-    # Apply rules and sort
-    scored_items = data_api.apply_rules_to_scores(scored_items)
-    scored_items.sort(key=lambda x: x["score"], reverse=True)
-    
-    # Find new rank
-    new_item = next((item for item in scored_items if item["item_id"] == request.itemId), None)
-    new_rank = scored_items.index(new_item) + 1 if new_item else len(scored_items) + 1
+    # Re-score only this item; its rank comes from the snapshot's sorted scores
+    result = await whatif_price_ranks(product, [request.newPrice])
+    current_rank = result["oldRank"]
+    new_rank = int(result["ranks"][0])
     
     rank_change = current_rank - new_rank
     
@@ -510,18 +985,112 @@ async def whatif_price(request: WhatIfPriceRequest, db: Session = Depends(get_db
     }
 
 
+@app.post("/whatif/price-curve")
+async def whatif_price_curve(request: WhatIfPriceCurveRequest, db: AsyncSession = Depends(get_async_db)):
+    """Score and rank curve of one item over a sweep of prices"""
+    if model is None:
+        raise HTTPException(status_code=500, detail="Model not loaded")
+    
+    if request.prices:
+        if min(request.prices) < 0:
+            raise HTTPException(status_code=400, detail="Prices must not be negative")
+        prices = [float(price) for price in request.prices]
+    elif request.minPrice is not None and request.maxPrice is not None:
+        if request.minPrice > request.maxPrice:
+            raise HTTPException(status_code=400, detail="minPrice must not exceed maxPrice")
+        prices = np.linspace(request.minPrice, request.maxPrice, request.points).tolist()
+    else:
+        raise HTTPException(status_code=400, detail="prices or minPrice/maxPrice is required")
+    
+    data_api = AsyncRetailDataAPI(db)
+    product = await data_api.get_product_by_id(request.itemId)
+    if not product:
+        raise HTTPException(status_code=404, detail=f"Item {request.itemId} not found")
+    
+    # All variants in one predict call; ranks by binary search in the snapshot
+    result = await whatif_price_ranks(product, prices)
+    old_rank = result["oldRank"]
+    
+    return {
+        "itemId": product.item_id,
+        "currentPrice": product.price,
+        "oldRank": old_rank,
+        "snapshotVersion": result["version"],
+        "curve": [
+            {
+                "price": round(price, 2),
+                "score": float(score),
+                "rank": int(rank),
+                "rankChange": old_rank - int(rank),
+            }
+            for price, score, rank in zip(prices, result["scores"], result["ranks"])
+        ],
+    }
+
+
+@app.get("/admin/model")
+async def get_model_status():
+    """Active and rollback model versions, reload counters"""
+    return model_registry.stats()
+
+
+@app.post("/admin/model/reload")
+async def reload_model_endpoint(request: Optional[ModelAdminRequest] = None, db: AsyncSession = Depends(get_async_db)):
+    """Load, warm and swap in the artifacts currently in azureml/"""
+    previous = model_registry.current()
+    try:
+        artifacts = await reload_model()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Model reload failed: {e}")
+    
+    await AsyncRetailDataAPI(db).log_audit(
+        action="model_reloaded",
+        entity_type="model",
+        entity_id=str(artifacts.version),
+        old_value=str(previous.version) if previous else None,
+        new_value=str(artifacts.version),
+        user=request.created_by if request else "system",
+        details=json.dumps(artifacts.warmup),
+        sync=True
+    )
+    
+    return {"status": "ok", "version": artifacts.version, "warmup": artifacts.warmup}
+
+
+@app.post("/admin/model/rollback")
+async def rollback_model_endpoint(request: Optional[ModelAdminRequest] = None, db: AsyncSession = Depends(get_async_db)):
+    """Swap the previous model version back in"""
+    current = model_registry.current()
+    try:
+        restored = await rollback_model()
+    except LookupError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    await AsyncRetailDataAPI(db).log_audit(
+        action="model_rolled_back",
+        entity_type="model",
+        entity_id=str(restored.version),
+        old_value=str(current.version),
+        new_value=str(restored.version),
+        user=request.created_by if request else "system",
+        sync=True
+    )
+    
+    return {"status": "ok", "version": restored.version}
+
+
 @app.post("/rules/pin")
-async def pin_item(request: PinRuleRequest, db: Session = Depends(get_db)):
+async def pin_item(request: PinRuleRequest, db: AsyncSession = Depends(get_async_db)):
     """Pin an item to the top of recommendations"""
-    data_api = RetailDataAPI(db)
+    data_api = AsyncRetailDataAPI(db)
     
     # Check if product exists
-    product = data_api.get_product_by_id(request.itemId)
+    product = await data_api.get_product_by_id(request.itemId)
     if not product:
         raise HTTPException(status_code=404, detail=f"Item {request.itemId} not found")
     
     # Create rule
-    rule = data_api.create_rule({
+    rule = await data_api.create_rule({
         "item_id": request.itemId,
         "rule_type": RuleType.PIN,
         "strength": 1.0,
@@ -529,61 +1098,116 @@ async def pin_item(request: PinRuleRequest, db: Session = Depends(get_db)):
     })
     
     # Log audit
-    data_api.log_audit(
+    await data_api.log_audit(
         action="rule_created",
         entity_type="rule",
         entity_id=str(rule.id),
         new_value=f"PIN {request.itemId}",
-        user=request.created_by
+        user=request.created_by,
+        sync=True
     )
     
     # Trigger immediate recalculation
-    await recalc_rankings_with_db(db, data_api)
+    await recalc_scheduler.run_now()
     
     return {"status": "ok", "message": f"Item {request.itemId} pinned", "rule_id": rule.id}
 
 
 @app.post("/rules/boost-clearance")
-async def boost_clearance(request: BoostClearanceRequest, db: Session = Depends(get_db)):
+async def boost_clearance(request: BoostClearanceRequest, db: AsyncSession = Depends(get_async_db)):
     """Boost clearance items"""
-    data_api = RetailDataAPI(db)
-    
-    # Get products in category (or all if no category)
-    if request.category:
-        products = data_api.get_products_by_category(request.category)
-    else:
-        products = data_api.get_all_products()
-    
-    # Create boost rules
-    rule_ids = []
-    for product in products:
-        # Check if already has active rule
-        existing_rules = data_api.get_active_rules(item_id=product.item_id)
-        if any(r.rule_type == RuleType.BOOST for r in existing_rules):
-            continue
-        
-        rule = data_api.create_rule({
-            "item_id": product.item_id,
-            "rule_type": RuleType.BOOST,
-            "strength": 1.5,  # 50% boost
-            "created_by": request.created_by,
-        })
-        rule_ids.append(rule.id)
+    data_api = AsyncRetailDataAPI(db)
+    
+    # One set-based insert for every in-stock product in the category (or catalog)
+    # that has no active boost yet
+    rule_ids = await data_api.create_rules_bulk(
+        RuleType.BOOST,
+        strength=1.5,  # 50% boost
+        category=request.category,
+        in_stock_only=True,
+        created_by=request.created_by,
+    )
     
     # Log audit
-    data_api.log_audit(
+    await data_api.log_audit(
         action="rules_created",
         entity_type="rule",
         new_value=f"BOOST {len(rule_ids)} items" + (f" in {request.category}" if request.category else ""),
-        user=request.created_by
+        user=request.created_by,
+        sync=True
     )
     
     # Trigger immediate recalculation
-    await recalc_rankings_with_db(db, data_api)
+    await recalc_scheduler.run_now()
     
     return {"status": "ok", "message": f"Boosted {len(rule_ids)} items", "rule_ids": rule_ids}
 
 
+@app.post("/rules/bulk")
+async def create_rules_bulk(request: BulkRuleRequest, db: AsyncSession = Depends(get_async_db)):
+    """Create (or update) one rule type for a category or item list in one transaction"""
+    if request.category is None and request.itemIds is None:
+        raise HTTPException(status_code=400, detail="category or itemIds is required")
+    try:
+        rule_type = RuleType(request.ruleType.lower())
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Unknown rule type: {request.ruleType}")
+    
+    data_api = AsyncRetailDataAPI(db)
+    if request.categoryScope:
+        # One rule on the category itself (also covers products added later)
+        if request.category is None:
+            raise HTTPException(status_code=400, detail="categoryScope requires a category")
+        existing = [
+            rule for rule in await data_api.get_active_rules()
+            if rule.item_id is None and rule.category == request.category and rule.rule_type == rule_type
+        ]
+        rule_ids = []
+        if not existing:
+            rule = await data_api.create_rule({
+                "category": request.category,
+                "rule_type": rule_type,
+                "strength": request.strength,
+                "expires_at": request.expiresAt,
+                "created_by": request.created_by,
+            })
+            rule_ids.append(rule.id)
+        elif request.updateExisting:
+            # Same semantics as the per-item path: expiry only changes when given
+            values = {"strength": request.strength}
+            if request.expiresAt is not None:
+                values["expires_at"] = request.expiresAt
+            for rule in existing:
+                await data_api.update_rule(rule.id, values)
+        updated = request.updateExisting and bool(existing)
+    else:
+        rule_ids = await data_api.create_rules_bulk(
+            rule_type,
+            strength=request.strength,
+            category=request.category,
+            item_ids=request.itemIds,
+            in_stock_only=request.inStockOnly,
+            expires_at=request.expiresAt,
+            created_by=request.created_by,
+            update_existing=request.updateExisting,
+        )
+        updated = request.updateExisting
+    
+    await data_api.log_audit(
+        action="rules_created",
+        entity_type="rule",
+        new_value=(f"{rule_type.name} category {request.category}" if request.categoryScope
+                   else f"{rule_type.name} {len(rule_ids)} items" + (f" in {request.category}" if request.category else ""))
+                  + (" (existing updated)" if updated else ""),
+        user=request.created_by,
+        sync=True
+    )
+    
+    await recalc_scheduler.run_now()
+    
+    return {"status": "ok", "message": f"Created {len(rule_ids)} {rule_type.value} rules", "rule_ids": rule_ids}
+
+
 # Marketplace Webhooks
 
 class AmazonWebhookEvent(BaseModel):
@@ -597,92 +1221,96 @@ class AmazonWebhookEvent(BaseModel):
     category: Optional[str] = None
 
 
+def get_or_create_amazon_product(data_api: RetailDataAPI, event: AmazonWebhookEvent) -> ProductSnapshot:
+    """Product for an Amazon webhook ASIN, created with default stock if new"""
+    db = data_api.db
+    product = data_api.get_product_by_id(event.asin)
+    if product:
+        return product
+    
+    store = db.query(Store).filter(Store.platform == StorePlatform.AMAZON).first()
+    if not store:
+        store = Store(name="Demo Marketplace A", platform=StorePlatform.AMAZON, is_active=True, connected=True)
+        db.add(store)
+        db.commit()
+        db.refresh(store)
+    
+    product = Product(
+        item_id=event.asin,
+        title=event.title or f"Demo Product {event.asin}",
+        category=event.category or "Unknown",
+        price=event.price,
+        stock=100,  # Default stock
+        store_id=store.id,
+        region=event.region,
+    )
+    db.add(product)
+    db.commit()
+    product_cache.invalidate(event.asin)
+    db.refresh(product)
+    feature_store.upsert(product)
+    dirty_items.mark(event.asin)
+    return ProductSnapshot.from_product(product)
+
+
 @app.post("/integrations/amazon/webhook")
-async def amazon_webhook(event: AmazonWebhookEvent, db: Session = Depends(get_db)):
+async def amazon_webhook(event: AmazonWebhookEvent, db: AsyncSession = Depends(get_async_db)):
     """
     Amazon marketplace webhook - EXACT IMPLEMENTATION
     Must: Reduce stock, Insert event, Recompute ranking, Log audit
     """
-    data_api = RetailDataAPI(db)
+    data_api = AsyncRetailDataAPI(db)
     item_id = event.asin
     qty = event.quantity
     price = event.price
     
     try:
         # Get or create product
-        product = data_api.get_product_by_id(item_id)
-        if not product:
-            # Create product if doesn't exist
-            store = db.query(Store).filter(Store.platform == StorePlatform.AMAZON).first()
-            if not store:
-                store = Store(name="Demo Marketplace A", platform=StorePlatform.AMAZON, is_active=True, connected=True)
-                db.add(store)
-                db.commit()
-                db.refresh(store)
-            
-            product = Product(
-                item_id=item_id,
-                title=event.title or f"Demo Product {item_id}",
-                category=event.category or "Unknown",
-                price=price,
-                stock=100,  # Default stock
-                store_id=store.id,
-                region=event.region,
-            )
-            db.add(product)
-            db.commit()
-            db.refresh(product)
+        product = await data_api.run_sync(get_or_create_amazon_product, event)
         
         # Handle ORDER_PLACED event
         if event.eventType == "ORDER_PLACED":
             # Update stock
-            product.stock = max(0, product.stock - qty)
-            db.commit()
+            await data_api.decrement_stock(product, qty)
             
             # Insert purchase event
-            purchase_event = Event(
-                item_id=item_id,
-                event_type=EventType.PURCHASE,
-                quantity=qty,
-                timestamp=datetime.utcnow(),
-                region=event.region,
-                revenue=price * qty,
-                user_id="amazon_user",  # System user
-            )
-            db.add(purchase_event)
-            db.commit()
+            await data_api.record_events([{
+                "item_id": item_id,
+                "event_type": EventType.PURCHASE,
+                "quantity": qty,
+                "timestamp": datetime.utcnow(),
+                "region": event.region,
+                "revenue": price * qty,
+                "user_id": "amazon_user",  # System user
+            }])
         
         elif event.eventType == "VIEW":
             # Insert view event
-            view_event = Event(
-                item_id=item_id,
-                event_type=EventType.VIEW,
-                quantity=qty,
-                timestamp=datetime.utcnow(),
-                region=event.region,
-                user_id="amazon_user",
-            )
-            db.add(view_event)
-            db.commit()
+            await data_api.record_events([{
+                "item_id": item_id,
+                "event_type": EventType.VIEW,
+                "quantity": qty,
+                "timestamp": datetime.utcnow(),
+                "region": event.region,
+                "user_id": "amazon_user",
+            }])
         
         elif event.eventType == "CLICK":
             # Insert click event
-            click_event = Event(
-                item_id=item_id,
-                event_type=EventType.CLICK,
-                quantity=qty,
-                timestamp=datetime.utcnow(),
-                region=event.region,
-                user_id="amazon_user",
-            )
-            db.add(click_event)
-            db.commit()
+            await data_api.record_events([{
+                "item_id": item_id,
+                "event_type": EventType.CLICK,
+                "quantity": qty,
+                "timestamp": datetime.utcnow(),
+                "region": event.region,
+                "user_id": "amazon_user",
+            }])
         
-        # Trigger immediate ranking recalculation
-        await recalc_rankings_with_db(db, data_api)
+        # Signal ranking recalculation (coalesced by the scheduler)
+        recalc_scheduler.signal()
         
         # Log audit
-        data_api.log_audit(
+        await data_api.log_audit(
             action="amazon_order" if event.eventType == "ORDER_PLACED" else f"amazon_{event.eventType.lower()}",
             entity_type="event",
             entity_id=item_id,
@@ -694,16 +1322,16 @@ async def amazon_webhook(event: AmazonWebhookEvent, db: Session = Depends(get_db
         
     except Exception as e:
         logger.error(f"Error processing Amazon webhook: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/integrations/myntra/webhook")
-async def myntra_webhook(webhook_data: MarketplaceWebhook, db: Session = Depends(get_db)):
+async def myntra_webhook(webhook_data: MarketplaceWebhook, db: AsyncSession = Depends(get_async_db)):
     """Myntra marketplace webhook"""
-    data_api = RetailDataAPI(db)
+    data_api = AsyncRetailDataAPI(db)
     
-    product = data_api.upsert_from_marketplace(
+    product = await data_api.upsert_from_marketplace(
         "Demo Marketplace B",
         "myntra",
         {
@@ -725,13 +1353,13 @@ async def myntra_webhook(webhook_data: MarketplaceWebhook, db: Session = Depends
         events.append({"event_type": EventType.PURCHASE, "quantity": webhook_data.orders, "revenue": (webhook_data.price or 0) * (webhook_data.orders or 0)})
     
     if events:
-        data_api.record_marketplace_events(product.item_id, events)
+        await data_api.record_marketplace_events(product.item_id, events)
     
-    # Trigger immediate ranking recalculation
-    await recalc_rankings_with_db(db, data_api)
+    # Signal ranking recalculation (coalesced by the scheduler)
+    recalc_scheduler.signal()
     
     # Log audit
-    data_api.log_audit(
+    await data_api.log_audit(
         action="myntra_webhook",
         entity_type="event",
         entity_id=product.item_id,
@@ -743,11 +1371,11 @@ async def myntra_webhook(webhook_data: MarketplaceWebhook, db: Session = Depends
 
 
 @app.post("/integrations/meesho/webhook")
-async def meesho_webhook(webhook_data: MarketplaceWebhook, db: Session = Depends(get_db)):
+async def meesho_webhook(webhook_data: MarketplaceWebhook, db: AsyncSession = Depends(get_async_db)):
     """Meesho marketplace webhook"""
-    data_api = RetailDataAPI(db)
+    data_api = AsyncRetailDataAPI(db)
     
-    product = data_api.upsert_from_marketplace(
+    product = await data_api.upsert_from_marketplace(
         "Demo Marketplace C",
         "meesho",
         {
@@ -769,13 +1397,13 @@ async def meesho_webhook(webhook_data: MarketplaceWebhook, db: Session = Depends
         events.append({"event_type": EventType.PURCHASE, "quantity": webhook_data.orders, "revenue": (webhook_data.price or 0) * (webhook_data.orders or 0)})
     
     if events:
-        data_api.record_marketplace_events(product.item_id, events)
+        await data_api.record_marketplace_events(product.item_id, events)
     
-    # Trigger immediate ranking recalculation
-    await recalc_rankings_with_db(db, data_api)
+    # Signal ranking recalculation (coalesced by the scheduler)
+    recalc_scheduler.signal()
     
     # Log audit
-    data_api.log_audit(
+    await data_api.log_audit(
         action="meesho_webhook",
         entity_type="event",
         entity_id=product.item_id,
@@ -818,19 +1446,8 @@ Global KPIs:
 - Avg Order Value: ₹{kpis.get('avgOrderValue', 0):,.0f}
 """)
     
-    # Top categories by revenue
-    since = datetime.utcnow() - timedelta(days=30)
-    events = db.query(Event).filter(Event.timestamp >= since).all()
-    
-    category_revenue = {}
-    for event in events:
-        if event.event_type == EventType.PURCHASE and event.revenue:
-            product = data_api.get_product_by_id(event.item_id)
-            if product:
-                cat = product.category or "Unknown"
-                category_revenue[cat] = category_revenue.get(cat, 0) + event.revenue
-    
-    top_categories = sorted(category_revenue.items(), key=lambda x: x[1], reverse=True)[:5]
+    # Top categories by revenue (hourly rollups joined to products)
+    top_categories = data_api.get_category_revenue(days=30, limit=5)
     if top_categories:
         ctx_parts.append(f"""
 Top Categories (by revenue):
@@ -840,8 +1457,10 @@ Top Categories (by revenue):
     # Low-performing products (low stock + low clicks)
     products = data_api.get_all_products(active_only=True)
     low_performers = []
-    for product in products[:50]:  # Limit to avoid too much data
-        metrics = data_api.get_product_metrics(product.item_id, days=7)
+    products = products[:50]  # Limit to avoid too much data
+    metrics_by_id = data_api.get_products_metrics([p.item_id for p in products], days=7)
+    for product in products:
+        metrics = metrics_by_id[product.item_id]
         ml_score = data_api.get_product_ml_score(product.item_id)
         
         if product.stock < 10 or (metrics.get('clicks', 0) < 10 and ml_score and ml_score.rank > 50):
@@ -885,36 +1504,10 @@ Selected Item: {product.title}
             # Get SHAP explanation
             try:
                 # Prepare features for SHAP
-                now = datetime.utcnow()
-                item_dict = {
-                    "item_id": product.item_id,
-                    "price": product.price,
-                    "stock": product.stock,
-                    "verified_purchase": product.verified_purchase or 0.0,
-                    "helpful_votes": product.helpful_votes or 0,
-                    "avg_rating": product.avg_rating or 0.0,
-                    "rating_count": product.rating_count or 0,
-                    "year": now.year,
-                    "month": now.month,
-                    "day_of_week": now.weekday(),
-                    "hour": now.hour,
-                    "recency_weight": 0.8,
-                    "category": product.category,
-                    "region": product.region or "IN",
-                    "store": product.store.name if product.store else "online",
-                    "main_category": product.main_category or product.category,
-                    "popularity_bucket": product.popularity_bucket or "medium",
-                    "price_bucket": product.price_bucket or "mid",
-                }
-                
-                X, _ = prepare_features([item_dict])
-                
-                global explainer
-                if explainer is None and model:
-                    explainer = shap.TreeExplainer(model)
+                X = item_feature_row(product, datetime.utcnow())
                 
-                if explainer and model:
-                    shap_values = explainer.shap_values(X)
+                if model is not None:
+                    shap_values = await compute_shap_values(X)
                     if len(shap_values.shape) == 1:
                         shap_dict = dict(zip(FEATURES, shap_values))
                     else:
@@ -0,0 +1,157 @@
+"""
+ReSight Audit Sink
+Write-behind queue for audit log entries: callers enqueue and return, a
+background thread inserts queued entries in batches (on size or time)
+"""
+
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import insert
+import logging
+
+from database import AuditLog
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class AuditSink:
+    """Bounded queue of audit rows drained by one writer thread"""
+
+    def __init__(self, max_queue: int = 10_000, batch_size: int = 200, flush_ms: float = 500):
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000.0
+        self._session_factory: Optional[Callable] = None
+        self._thread: Optional[threading.Thread] = None
+        # Metrics
+        self.enqueued_total = 0
+        self.overflows_total = 0
+        self.written_total = 0
+        self.batches_total = 0
+        self.failures_total = 0
+        self.dropped_total = 0
+        self.last_flush_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, session_factory: Callable) -> None:
+        """Start the writer thread; entries are written with sessions from session_factory"""
+        if self.running:
+            return
+        self._session_factory = session_factory
+        self._thread = threading.Thread(target=self._run, name="audit-sink", daemon=True)
+        self._thread.start()
+        logger.info(f"[OK] Audit sink started (batch {self.batch_size}, {self.flush_interval * 1000:.0f} ms)")
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Flush everything queued, then stop the writer thread (blocks)"""
+        if not self.running:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+        logger.info(f"[OK] Audit sink stopped ({self.written_total} entries written)")
+
+    def submit(self, entry: Dict) -> bool:
+        """Queue one audit row; False when the sink is not running or the queue is full"""
+        if not self.running:
+            return False
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.overflows_total += 1
+            return False
+        self.enqueued_total += 1
+        return True
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch, stopping = self._next_batch()
+            if batch:
+                self._write(batch)
+
+    def _next_batch(self):
+        """Block for the first entry, then collect until batch_size or flush_interval"""
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch: List[Dict] = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                entry = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                # Shutdown: drain whatever is left without waiting
+                batch.extend(self._drain())
+                return batch, True
+            batch.append(entry)
+        return batch, False
+
+    def _drain(self) -> List[Dict]:
+        entries = []
+        while True:
+            try:
+                entry = self._queue.get_nowait()
+            except queue.Empty:
+                return entries
+            if entry is not _STOP:
+                entries.append(entry)
+
+    def _write(self, batch: List[Dict], attempts: int = 3) -> None:
+        start = time.perf_counter()
+        for attempt in range(1, attempts + 1):
+            db = self._session_factory()
+            try:
+                db.execute(insert(AuditLog), batch)
+                db.commit()
+                self.written_total += len(batch)
+                self.batches_total += 1
+                break
+            except Exception as e:
+                db.rollback()
+                self.failures_total += 1
+                if attempt == attempts:
+                    self.dropped_total += len(batch)
+                    logger.error(f"Audit sink dropped {len(batch)} entries: {e}")
+                else:
+                    time.sleep(0.1 * attempt)
+            finally:
+                db.close()
+        self.last_flush_ms = (time.perf_counter() - start) * 1000
+
+    def stats(self) -> Dict:
+        return {
+            "running": self.running,
+            "queued": self._queue.qsize(),
+            "maxQueue": self._queue.maxsize,
+            "enqueued": self.enqueued_total,
+            "overflows": self.overflows_total,
+            "written": self.written_total,
+            "batches": self.batches_total,
+            "avgBatch": round(self.written_total / self.batches_total, 2) if self.batches_total else 0.0,
+            "failures": self.failures_total,
+            "dropped": self.dropped_total,
+            "lastFlushMs": round(self.last_flush_ms, 2),
+        }
+
+
+# Process-wide sink; started by the API lifespan, scripts write synchronously
+audit_sink = AuditSink(
+    max_queue=int(os.getenv("AUDIT_QUEUE_SIZE", "10000")),
+    batch_size=int(os.getenv("AUDIT_BATCH_SIZE", "200")),
+    flush_ms=float(os.getenv("AUDIT_FLUSH_MS", "500")),
+)
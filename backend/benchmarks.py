@@ -0,0 +1,271 @@
+"""
+ReSight performance benchmarks
+Run from backend/: python benchmarks.py <benchmark> [options]
+"""
+
+import argparse
+import os
+import time
+
+import joblib
+import numpy as np
+
+ARTIFACT_DIR = os.path.join(os.path.dirname(__file__), "..", "azureml")
+
+
+def _time_call(fn, repeat: int) -> float:
+    """Median wall time of fn() in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+
+def bench_tree_evaluator(args):
+    """Parity and latency of the NumPy tree evaluator against LightGBM"""
+    from tree_evaluator import CompiledForest, check_parity, sample_inputs
+
+    model = joblib.load(os.path.join(ARTIFACT_DIR, "lightgbm_ranker.pkl"))
+    start = time.perf_counter()
+    forest = CompiledForest.from_model(model)
+    print(f"[OK] Compiled {forest.num_trees} trees, max depth {forest.max_depth} "
+          f"in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    X = sample_inputs(model, n=max(args.batch_sizes), seed=args.seed)
+    diff = check_parity(forest, model, X, tolerance=args.tolerance)
+    print(f"[OK] Parity on {len(X)} rows: max |lightgbm - numpy| = {diff:.3g}")
+
+    print(f"\n{'batch':>8} {'lightgbm ms':>12} {'numpy ms':>10} {'speedup':>8}")
+    for n in args.batch_sizes:
+        batch = X[:n]
+        lgb_ms = _time_call(lambda: model.predict(batch), args.repeat)
+        np_ms = _time_call(lambda: forest.predict(batch), args.repeat)
+        print(f"{n:>8} {lgb_ms:>12.3f} {np_ms:>10.3f} {lgb_ms / np_ms:>7.2f}x")
+
+
+def bench_ml_scores(args):
+    """Bulk upsert of ml_scores (update_ml_scores) at several catalog sizes"""
+    import tempfile
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench_ml_scores.db")
+    from sqlalchemy import delete, insert
+    from database import MLScore, Product, SessionLocal, init_db
+    from retail_data_api import RetailDataAPI, _ml_scores_written
+
+    init_db()
+    rng = np.random.default_rng(args.seed)
+    print(f"{'rows':>9} {'insert ms':>10} {'upsert ms':>10} {'rows/s':>10} {'moved':>8} {'1% moved ms':>12}")
+    for n in args.sizes:
+        db = SessionLocal()
+        try:
+            _ml_scores_written.clear()  # Table is reset below
+            db.execute(delete(MLScore))
+            db.execute(delete(Product))
+            db.execute(insert(Product), [
+                {"item_id": f"B-{i}", "title": f"Bench {i}", "category": "Bench", "price": 1.0, "store_id": 1}
+                for i in range(n)
+            ])
+            db.commit()
+
+            api = RetailDataAPI(db)
+            items = [f"B-{i}" for i in range(n)]
+            first = [{"item_id": item_id, "score": float(n - i), "rank": i + 1} for i, item_id in enumerate(items)]
+            start = time.perf_counter()
+            api.update_ml_scores(first)
+            insert_ms = (time.perf_counter() - start) * 1000
+
+            # Second pass reshuffles ranks, exercising the conflict/update path
+            order = rng.permutation(n)
+            second = [{"item_id": items[j], "score": float(n - r), "rank": r + 1} for r, j in enumerate(order)]
+            start = time.perf_counter()
+            api.update_ml_scores(second)
+            upsert_ms = (time.perf_counter() - start) * 1000
+
+            moved = db.query(MLScore).filter(MLScore.previous_rank != MLScore.rank).count()
+
+            # Steady state: a pass that swaps 1% of ranks writes only those rows
+            api.update_ml_scores(second)
+            third = [dict(row) for row in second]
+            for a, b in rng.integers(0, n, (max(1, n // 200), 2)):
+                third[a]["rank"], third[b]["rank"] = third[b]["rank"], third[a]["rank"]
+            start = time.perf_counter()
+            api.update_ml_scores(third)
+            partial_ms = (time.perf_counter() - start) * 1000
+            print(f"{n:>9} {insert_ms:>10.0f} {upsert_ms:>10.0f} {n / (upsert_ms / 1000):>10.0f} {moved:>8} {partial_ms:>12.0f}")
+        finally:
+            db.close()
+
+
+def _ingest_run(args):
+    """Child process for bench_ingest: engine profile comes from the environment"""
+    import asyncio
+    import json
+    from database import AsyncSessionLocal, SessionLocal, Store, StorePlatform, EventType, init_db
+    from retail_data_api import AsyncRetailDataAPI, RetailDataAPI
+
+    init_db()
+    db = SessionLocal()
+    api = RetailDataAPI(db)
+    store = Store(name="Bench", platform=StorePlatform.AMAZON, is_active=False)
+    db.add(store)
+    db.commit()
+    for i in range(args.products):
+        api.upsert_product({"item_id": f"B-{i}", "title": f"Bench {i}", "category": "Bench",
+                            "price": 10.0, "stock": 100, "store_id": store.id})
+    db.close()
+
+    event_types = [EventType.VIEW, EventType.CLICK, EventType.PURCHASE]
+    errors = 0
+    reads = 0
+
+    async def writer(w):
+        nonlocal errors
+        async with AsyncSessionLocal() as session:
+            data_api = AsyncRetailDataAPI(session)
+            for n in range(args.events):
+                try:
+                    await data_api.record_event({
+                        "user_id": f"w{w}", "item_id": f"B-{(w * args.events + n) % args.products}",
+                        "event_type": event_types[n % 3], "quantity": 1, "revenue": 10.0 if n % 3 == 2 else 0.0,
+                    })
+                except Exception:
+                    errors += 1
+
+    async def reader(done):
+        nonlocal reads
+        while not done.is_set():
+            async with AsyncSessionLocal() as session:
+                await AsyncRetailDataAPI(session).get_global_kpis("24h")
+            reads += 1
+
+    async def run():
+        done = asyncio.Event()
+        readers = [asyncio.create_task(reader(done)) for _ in range(args.readers)]
+        start = time.perf_counter()
+        await asyncio.gather(*(writer(w) for w in range(args.writers)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await asyncio.gather(*readers)
+        return elapsed
+
+    elapsed = asyncio.run(run())
+    written = args.writers * args.events - errors
+    print(json.dumps({"events_per_s": written / elapsed, "errors": errors, "reads_per_s": reads / elapsed}))
+
+
+def bench_ingest(args):
+    """Event ingest throughput per SQLite engine profile (concurrent writers plus KPI readers)"""
+    if args.child:
+        return _ingest_run(args)
+
+    import json
+    import subprocess
+    import sys
+    import tempfile
+
+    print(f"{args.writers} writers x {args.events} events, {args.readers} KPI readers\n")
+    print(f"{'profile':>12} {'events/s':>10} {'reads/s':>9} {'errors':>7}")
+    for profile in args.profiles:
+        env = dict(os.environ, SQLITE_PROFILE=profile,
+                   DATABASE_URL=f"sqlite:///{tempfile.mkdtemp()}/bench_ingest.db")
+        env.pop("ASYNC_DATABASE_URL", None)
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "ingest", "--child",
+             "--writers", str(args.writers), "--events", str(args.events),
+             "--readers", str(args.readers), "--products", str(args.products)],
+            env=env, capture_output=True, text=True, check=True,
+        ).stdout.strip().splitlines()[-1]
+        result = json.loads(out)
+        print(f"{profile:>12} {result['events_per_s']:>10.0f} {result['reads_per_s']:>9.1f} {result['errors']:>7}")
+
+
+def bench_rules(args):
+    """Rule application (compile + order) over catalogs with item and category rules"""
+    from types import SimpleNamespace
+    from rule_engine import compile_rules
+
+    rng = np.random.default_rng(args.seed)
+    types = np.array(["boost", "demote", "remove", "pin"])
+    print(f"{'items':>10} {'rules':>8} {'compile ms':>11} {'order ms':>9}")
+    for size in args.sizes:
+        item_ids = [f"ITEM-{i}" for i in range(size)]
+        categories = [f"CAT-{i % 50}" for i in range(size)]
+        scores = rng.normal(size=size)
+        n_rules = int(size * args.rule_fraction)
+        rules = [
+            SimpleNamespace(item_id=item_ids[i], category=None, rule_type=t, strength=1.5)
+            for i, t in zip(rng.integers(0, size, n_rules), rng.choice(types, n_rules, p=[0.6, 0.2, 0.1, 0.1]))
+        ] + [SimpleNamespace(item_id=None, category=f"CAT-{c}", rule_type="boost", strength=1.2) for c in range(5)]
+        compile_ms = _time_call(lambda: compile_rules(rules, item_ids, categories), args.repeat)
+        compiled = compile_rules(rules, item_ids, categories)
+        order_ms = _time_call(lambda: compiled.order(scores), args.repeat)
+        print(f"{size:>10} {len(rules):>8} {compile_ms:>11.1f} {order_ms:>9.1f}")
+
+
+def bench_whatif(args):
+    """What-if rank lookup (binary search in a ranking snapshot) against a full re-sort"""
+    from ranking_snapshot import SnapshotStore
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'items':>10} {'publish ms':>11} {'rank_of us':>11} {'50 prices us':>13} {'re-sort ms':>11}")
+    for size in args.sizes:
+        scores = rng.normal(size=size)
+        rows = [{"item_id": f"ITEM-{i}", "score": float(score)} for i, score in enumerate(scores)]
+        start = time.perf_counter()
+        snapshot = SnapshotStore().publish(rows)
+        publish_ms = (time.perf_counter() - start) * 1000
+        own, new = snapshot.get("ITEM-0"), scores[0] + 0.5
+        curve = scores[0] + rng.normal(size=50)
+        lookup_us = _time_call(lambda: snapshot.rank_of(new, own=own), args.repeat) * 1000
+        curve_us = _time_call(lambda: snapshot.rank_of(curve, own=own), args.repeat) * 1000
+        resorted = scores.copy()
+        resorted[0] = new
+        resort_ms = _time_call(lambda: np.argsort(-resorted, kind="stable"), max(1, args.repeat // 100))
+        print(f"{size:>10} {publish_ms:>11.1f} {lookup_us:>11.1f} {curve_us:>13.1f} {resort_ms:>11.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    sub = parser.add_subparsers(dest="benchmark", required=True)
+
+    p = sub.add_parser("tree-evaluator", help=bench_tree_evaluator.__doc__)
+    p.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 64, 1000, 10000])
+    p.add_argument("--repeat", type=int, default=20)
+    p.add_argument("--tolerance", type=float, default=1e-6)
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=bench_tree_evaluator)
+
+    p = sub.add_parser("ml-scores", help=bench_ml_scores.__doc__)
+    p.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=bench_ml_scores)
+
+    p = sub.add_parser("ingest", help=bench_ingest.__doc__)
+    p.add_argument("--profiles", nargs="+", default=["default", "production"])
+    p.add_argument("--writers", type=int, default=8)
+    p.add_argument("--events", type=int, default=250, help="Events per writer")
+    p.add_argument("--readers", type=int, default=2)
+    p.add_argument("--products", type=int, default=200)
+    p.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    p.set_defaults(func=bench_ingest)
+
+    p = sub.add_parser("rules", help=bench_rules.__doc__)
+    p.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    p.add_argument("--rule-fraction", type=float, default=0.05, help="Item rules per product")
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=bench_rules)
+
+    p = sub.add_parser("whatif", help=bench_whatif.__doc__)
+    p.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    p.add_argument("--repeat", type=int, default=200)
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=bench_whatif)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
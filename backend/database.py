@@ -3,12 +3,21 @@ ReSight Retail Data Store
 Database models and core data layer for Indian e-commerce marketplace integrations
 """
 
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean, Enum, ForeignKey, Text
+from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean, Enum, ForeignKey, Text, Index, UniqueConstraint
+from sqlalchemy import inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 import os
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy import event
+from sqlalchemy.orm import Session, sessionmaker, relationship
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from datetime import datetime
+import asyncio
 import enum
+import logging
+
+logger = logging.getLogger(__name__)
 
 Base = declarative_base()
 
@@ -138,12 +147,50 @@ class Event(Base):
         }
 
 
+class EventRollup(Base):
+    """Hourly event counters per item, event type and region (maintained on ingest)"""
+    __tablename__ = "event_rollups_hourly"
+    __table_args__ = (
+        UniqueConstraint("bucket", "item_id", "event_type", "region", name="uq_event_rollup_key"),
+        Index("ix_event_rollup_item_bucket", "item_id", "bucket"),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    bucket = Column(DateTime, nullable=False, index=True)  # Start of the UTC hour
+    item_id = Column(String(100), ForeignKey("products.item_id"), nullable=False)
+    event_type = Column(Enum(EventType), nullable=False)
+    region = Column(String(50), nullable=False, default="IN")
+    events = Column(Integer, nullable=False, default=0)  # Event rows
+    units = Column(Integer, nullable=False, default=0)  # Sum of quantity
+    revenue = Column(Float, nullable=False, default=0.0)
+    
+    def to_dict(self):
+        return {
+            "bucket": self.bucket.isoformat(),
+            "item_id": self.item_id,
+            "event_type": self.event_type.value,
+            "region": self.region,
+            "events": self.events,
+            "units": self.units,
+            "revenue": self.revenue,
+        }
+
+
+class RollupHistory(Base):
+    """Single-row counter bumped whenever closed rollup hours change (shared across processes)"""
+    __tablename__ = "rollup_history"
+    
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
 class Rule(Base):
     """Manual override rules for product ranking"""
     __tablename__ = "rules"
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    item_id = Column(String(100), ForeignKey("products.item_id"), nullable=False, index=True)
+    item_id = Column(String(100), ForeignKey("products.item_id"), nullable=True, index=True)  # Item-scope rule
+    category = Column(String(100), index=True)  # Category-scope rule (item_id is NULL)
     rule_type = Column(Enum(RuleType), nullable=False)
     strength = Column(Float, default=1.0)  # Multiplier for boost/demote
     expires_at = Column(DateTime)  # Optional expiration
@@ -157,6 +204,7 @@ class Rule(Base):
         return {
             "id": self.id,
             "item_id": self.item_id,
+            "category": self.category,
             "rule_type": self.rule_type.value,
             "strength": self.strength,
             "expires_at": self.expires_at.isoformat() if self.expires_at else None,
@@ -222,18 +270,201 @@ def get_database_url():
 
 DATABASE_URL = get_database_url()
 
-engine = create_engine(
+# SQLite engine profile: "production" (WAL, tuned pragmas, one writer connection
+# plus a read pool) or "default" (driver defaults, one shared pool)
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "production").lower()
+
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),  # Durable at checkpoints under WAL
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),  # Negative = KiB (64 MB)
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "temp_store": "MEMORY",
+}
+
+# Read connections per engine (the production profile always has exactly one writer)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
+
+def use_sqlite_profile(url: str) -> bool:
+    """Production profile applies to file-backed SQLite databases"""
+    return (SQLITE_PROFILE == "production" and url.startswith("sqlite")
+            and ":memory:" not in url and not url.rstrip("/").endswith(":"))
+
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Connect hook: set the profile's pragmas on every new SQLite connection"""
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def build_engines(url: str, factory=create_engine, **kwargs):
+    """(reader, writer) engines for url; writer is None unless the SQLite profile applies"""
+    if url.startswith("sqlite"):
+        kwargs.setdefault("connect_args", {"check_same_thread": False})
+    if not use_sqlite_profile(url):
+        return factory(url, **kwargs), None
+    
+    kwargs["poolclass"] = AsyncAdaptedQueuePool if factory is create_async_engine else QueuePool
+    reader = factory(url, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, **kwargs)
+    # A single writer connection: in-process writes queue on the pool instead of
+    # racing for SQLite's write lock
+    writer = factory(url, pool_size=1, max_overflow=0, **kwargs)
+    for target in (reader, writer):
+        event.listen(getattr(target, "sync_engine", target), "connect", apply_sqlite_pragmas)
+    return reader, writer
+
+
+class RoutingSession(Session):
+    """Session that sends flushes and INSERT/UPDATE/DELETE to the writer engine
+    and plain reads to the reader pool
+    
+    Once a transaction has written, its later reads use the writer too, so it
+    sees its own uncommitted changes.
+    """
+    
+    def __init__(self, reader=None, writer=None, **kwargs):
+        super().__init__(**kwargs)
+        self.reader = reader
+        self.writer = writer
+        self.writing = False
+    
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.writer is None:
+            return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+        if self.writing or isinstance(clause, UpdateBase):
+            self.writing = True
+            return self.writer
+        return self.reader
+
+
+@event.listens_for(RoutingSession, "before_flush")
+def _begin_writing(session, flush_context, instances):
+    # Fires only when there is something to flush, before its connection is chosen
+    session.writing = True
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _end_writing(session, transaction):
+    if transaction.parent is None:
+        session.writing = False
+
+
+engine, write_engine = build_engines(
     DATABASE_URL,
-    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {},
     echo=False  # Set to True for SQL query logging
 )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(
+    class_=RoutingSession, reader=engine, writer=write_engine,
+    autocommit=False, autoflush=False, bind=engine
+)
+
+
+# Async engine for endpoints that should not block the event loop on database I/O
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def get_async_database_url(url: str = DATABASE_URL) -> str:
+    """ASYNC_DATABASE_URL, or DATABASE_URL with its async driver (sqlite -> aiosqlite)"""
+    explicit = os.getenv("ASYNC_DATABASE_URL")
+    if explicit:
+        return explicit
+    scheme, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+
+ASYNC_DATABASE_URL = get_async_database_url()
+
+try:
+    async_engine, async_write_engine = build_engines(ASYNC_DATABASE_URL, factory=create_async_engine, echo=False)
+    # Objects stay usable after commit: attribute reloads cannot happen outside the session's greenlet
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, sync_session_class=RoutingSession,
+        reader=async_engine.sync_engine,
+        writer=async_write_engine.sync_engine if async_write_engine else None,
+        autoflush=False, expire_on_commit=False
+    )
+except ImportError as e:
+    # Async driver not installed: async callers get sync sessions run on worker threads
+    logger.warning(f"Async database driver unavailable for {ASYNC_DATABASE_URL} ({e}); "
+                   f"falling back to sync sessions on worker threads")
+    async_engine = async_write_engine = None
+    AsyncSessionLocal = None
+
+
+class ThreadedSession:
+    """Stand-in for AsyncSession when no async driver is installed
+    
+    Wraps a SessionLocal session and runs run_sync, commit, rollback and
+    close on a worker thread, so async callers work unchanged and the event
+    loop is not blocked (database waits still hold a thread).
+    """
+    
+    def __init__(self):
+        self.sync_session = SessionLocal()
+    
+    async def __aenter__(self) -> "ThreadedSession":
+        return self
+    
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+    
+    async def run_sync(self, fn, *args, **kwargs):
+        return await asyncio.to_thread(fn, self.sync_session, *args, **kwargs)
+    
+    async def commit(self) -> None:
+        await asyncio.to_thread(self.sync_session.commit)
+    
+    async def rollback(self) -> None:
+        await asyncio.to_thread(self.sync_session.rollback)
+    
+    async def close(self) -> None:
+        await asyncio.to_thread(self.sync_session.close)
+
+
+if AsyncSessionLocal is None:
+    AsyncSessionLocal = ThreadedSession
+
+
+def upgrade_rules_table(bind) -> None:
+    """Bring a rules table created before category-scope rules up to date
+    
+    Adds the category column and drops NOT NULL from item_id (SQLite cannot
+    alter a column, so the table is rebuilt and its rows copied).
+    """
+    columns = {column["name"]: column for column in inspect(bind).get_columns("rules")}
+    if "category" in columns and columns["item_id"]["nullable"]:
+        return
+    
+    with bind.begin() as conn:
+        if bind.dialect.name == "sqlite":
+            copied = ", ".join(name for name in columns if name in Rule.__table__.c)
+            conn.execute(text("ALTER TABLE rules RENAME TO rules_old"))
+            for index in Rule.__table__.indexes:
+                conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+            Rule.__table__.create(conn)
+            conn.execute(text(f"INSERT INTO rules ({copied}) SELECT {copied} FROM rules_old"))
+            conn.execute(text("DROP TABLE rules_old"))
+        else:
+            if "category" not in columns:
+                conn.execute(text("ALTER TABLE rules ADD COLUMN category VARCHAR(100)"))
+                conn.execute(text("CREATE INDEX ix_rules_category ON rules (category)"))
+            conn.execute(text("ALTER TABLE rules ALTER COLUMN item_id DROP NOT NULL"))
 
 
 def init_db():
     """Initialize database tables"""
-    Base.metadata.create_all(bind=engine)
+    bind = write_engine or engine
+    Base.metadata.create_all(bind=bind)
+    upgrade_rules_table(bind)
 
 
 def get_db():
@@ -243,3 +474,9 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """Dependency for FastAPI to get an async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,47 @@
+"""
+ReSight Dirty-Set Tracker
+Records which products changed since the last ranking pass so that
+recalc_rankings_with_db only re-predicts the rows that actually moved
+"""
+
+import threading
+from typing import Iterable, Set, Tuple
+
+
+class DirtyTracker:
+    """Thread-safe set of item_ids touched since the last drain"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items: Set[str] = set()
+        self._full = True  # Nothing has been scored yet
+
+    def mark(self, *item_ids: str) -> None:
+        """Flag one or more products for re-scoring"""
+        self.mark_many(item_ids)
+
+    def mark_many(self, item_ids: Iterable[str]) -> None:
+        """Flag a batch of products for re-scoring"""
+        with self._lock:
+            self._items.update(i for i in item_ids if i)
+
+    def mark_all(self) -> None:
+        """Force the next pass to re-score the whole catalog"""
+        with self._lock:
+            self._full = True
+
+    def drain(self) -> Tuple[bool, Set[str]]:
+        """Return (full_pass_required, dirty_item_ids) and reset the tracker"""
+        with self._lock:
+            full, items = self._full, self._items
+            self._full = False
+            self._items = set()
+        return full, items
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._items)
+
+
+# Process-wide tracker shared by the data API, webhooks and the ranking engine
+dirty_items = DirtyTracker()
@@ -0,0 +1,50 @@
+"""
+ReSight Categorical Encoding
+Array-backed lookup tables compiled from the sklearn LabelEncoders in
+azureml/encoders.pkl, applied with vectorized NumPy mapping
+"""
+
+from typing import Dict, Iterable
+
+import numpy as np
+
+# Code assigned to labels the encoder never saw during training
+UNKNOWN_CODE = -1
+
+
+class CategoryLookup:
+    """Label -> integer code table for one categorical column"""
+
+    def __init__(self, classes: Iterable):
+        classes = np.asarray([str(c) for c in classes])
+        order = np.argsort(classes, kind="stable")
+        self.classes = classes
+        self._sorted = classes[order]
+        self._codes = order.astype(np.int64)
+        self._index = {label: i for i, label in enumerate(classes)}
+
+    @classmethod
+    def from_encoder(cls, encoder) -> "CategoryLookup":
+        return cls(encoder.classes_)
+
+    def __len__(self) -> int:
+        return len(self.classes)
+
+    def encode(self, values) -> np.ndarray:
+        """Encode a batch of labels; unseen labels get UNKNOWN_CODE"""
+        values = np.asarray(["" if v is None else str(v) for v in values])
+        if not len(values) or not len(self._sorted):
+            return np.full(len(values), UNKNOWN_CODE, dtype=np.int64)
+        pos = np.searchsorted(self._sorted, values)
+        pos = np.minimum(pos, len(self._sorted) - 1)
+        found = self._sorted[pos] == values
+        return np.where(found, self._codes[pos], UNKNOWN_CODE)
+
+    def encode_one(self, value) -> int:
+        """Encode a single label; unseen labels get UNKNOWN_CODE"""
+        return self._index.get("" if value is None else str(value), UNKNOWN_CODE)
+
+
+def compile_encoders(encoders: Dict) -> Dict[str, CategoryLookup]:
+    """Compile a {column: LabelEncoder} mapping into lookup tables"""
+    return {col: CategoryLookup.from_encoder(encoder) for col, encoder in (encoders or {}).items()}
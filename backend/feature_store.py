@@ -0,0 +1,316 @@
+"""
+ReSight Feature Store
+Resident, NumPy-backed feature matrix for the ranking engine: one row per
+product, columns in FEATURES order, categorical columns already encoded
+"""
+
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import logging
+
+from encoding import UNKNOWN_CODE
+
+logger = logging.getLogger(__name__)
+
+# Columns filled at read time from the scoring clock instead of per product
+TIME_FEATURES = ("year", "month", "day_of_week", "hour")
+
+# Constant recency weight used by the online ranker
+RECENCY_WEIGHT = 0.8
+
+
+def product_raw_features(product) -> Dict:
+    """Raw (unencoded) per-product feature values, keyed by feature name"""
+    return {
+        "verified_purchase": product.verified_purchase or 0.0,
+        "helpful_votes": product.helpful_votes or 0,
+        "price": product.price,
+        "avg_rating": product.avg_rating or 0.0,
+        "rating_count": product.rating_count or 0,
+        "recency_weight": RECENCY_WEIGHT,
+        "category": product.category,
+        "region": product.region or "IN",
+        "store": product.store.name if product.store else "online",
+        "main_category": product.main_category or product.category,
+        "popularity_bucket": product.popularity_bucket or "medium",
+        "price_bucket": product.price_bucket or "mid",
+    }
+
+
+def price_bucket_for(price: float) -> str:
+    """Price bucket label for a simulated or caller-supplied price"""
+    return "budget" if price < 50 else ("mid" if price < 150 else "premium")
+
+
+def product_info(product) -> Dict:
+    """Display fields kept next to the feature row (served by ranking snapshots)"""
+    return {
+        "title": product.title,
+        "category": product.category,
+        "price": product.price,
+        "stock": product.stock or 0,
+        "image_url": product.image_url,
+        "brand": product.brand,
+    }
+
+
+class FeatureStore:
+    """Encoded feature rows for every product, updated in place on writes"""
+
+    def __init__(self, initial_capacity: int = 1024):
+        self._lock = threading.RLock()
+        self._initial_capacity = initial_capacity
+        self.features: List[str] = []
+        self.lookups: Dict = {}
+        self._col: Dict[str, int] = {}
+        self._reset()
+
+    def _reset(self) -> None:
+        n_cols = len(self.features)
+        self._matrix = np.zeros((self._initial_capacity, n_cols), dtype=np.float64)
+        self._stock = np.zeros(self._initial_capacity, dtype=np.int64)
+        self._scores = np.full(self._initial_capacity, np.nan, dtype=np.float64)
+        self._item_ids: List[str] = []
+        self._info: List[Dict] = []
+        self._index: Dict[str, int] = {}
+
+    # Setup
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.features)
+
+    def configure(self, features: List[str], lookups: Dict) -> None:
+        """Bind to a feature list and compiled lookup tables; drops all resident rows"""
+        with self._lock:
+            self.features = list(features)
+            self.lookups = lookups or {}
+            self._col = {name: i for i, name in enumerate(self.features)}
+            self._reset()
+
+    def load(self, products: Iterable) -> int:
+        """Rebuild the matrix from a full product listing"""
+        products = list(products)
+        with self._lock:
+            self._reset()
+            self._ensure_capacity(len(products))
+            raw = [product_raw_features(p) for p in products]
+            for name, col in self._col.items():
+                if name in TIME_FEATURES:
+                    continue
+                values = [r.get(name, 0) for r in raw]
+                self._matrix[:len(products), col] = self._encode_column(name, values)
+            for row, product in enumerate(products):
+                self._item_ids.append(product.item_id)
+                self._info.append(product_info(product))
+                self._index[product.item_id] = row
+                self._stock[row] = product.stock or 0
+        logger.info(f"[OK] Feature store loaded {len(products)} products")
+        return len(products)
+
+    # Encoding
+
+    def _encode_column(self, name: str, values: List) -> np.ndarray:
+        lookup = self.lookups.get(name)
+        if lookup is None:
+            return np.asarray(values, dtype=np.float64)
+        return lookup.encode(values).astype(np.float64)
+
+    def encode_value(self, name: str, value) -> float:
+        """Encode a single raw value for the given feature column"""
+        lookup = self.lookups.get(name)
+        if lookup is None:
+            return float(value or 0)
+        return float(lookup.encode_one(value))
+
+    def column(self, name: str) -> Optional[int]:
+        """Matrix column index for a feature name"""
+        return self._col.get(name)
+
+    # Writes
+
+    def _ensure_capacity(self, size: int) -> None:
+        capacity = self._matrix.shape[0]
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        grow = capacity - self._matrix.shape[0]
+        self._matrix = np.vstack([self._matrix, np.zeros((grow, self._matrix.shape[1]))])
+        self._stock = np.concatenate([self._stock, np.zeros(grow, dtype=np.int64)])
+        self._scores = np.concatenate([self._scores, np.full(grow, np.nan)])
+
+    def upsert(self, product) -> None:
+        """Encode one product into its row, appending it if new"""
+        if not self.configured:
+            return
+        raw = product_raw_features(product)
+        with self._lock:
+            row = self._index.get(product.item_id)
+            if row is None:
+                row = len(self._item_ids)
+                self._ensure_capacity(row + 1)
+                self._item_ids.append(product.item_id)
+                self._info.append({})
+                self._index[product.item_id] = row
+                self._scores[row] = np.nan
+            self._info[row] = product_info(product)
+            for name, col in self._col.items():
+                if name not in TIME_FEATURES:
+                    self._matrix[row, col] = self.encode_value(name, raw.get(name, 0))
+            self._stock[row] = product.stock or 0
+
+    def set_stock(self, item_id: str, stock: int) -> None:
+        """Update the stock of a resident row"""
+        with self._lock:
+            row = self._index.get(item_id)
+            if row is not None:
+                self._stock[row] = stock or 0
+                self._info[row] = dict(self._info[row], stock=stock or 0)
+
+    def remove(self, item_id: str) -> None:
+        """Drop a product row (swaps the last row into its slot)"""
+        with self._lock:
+            row = self._index.pop(item_id, None)
+            if row is None:
+                return
+            last = len(self._item_ids) - 1
+            if row != last:
+                moved = self._item_ids[last]
+                self._matrix[row] = self._matrix[last]
+                self._stock[row] = self._stock[last]
+                self._scores[row] = self._scores[last]
+                self._item_ids[row] = moved
+                self._info[row] = self._info[last]
+                self._index[moved] = row
+            self._item_ids.pop()
+            self._info.pop()
+
+    def set_scores(self, item_ids: List[str], scores) -> None:
+        """Store raw model scores for the given rows"""
+        with self._lock:
+            rows = [self._index[i] for i in item_ids if i in self._index]
+            if len(rows) == len(item_ids):
+                self._scores[rows] = scores
+            else:
+                for item_id, score in zip(item_ids, scores):
+                    row = self._index.get(item_id)
+                    if row is not None:
+                        self._scores[row] = score
+
+    # Reads
+
+    def __len__(self) -> int:
+        return len(self._item_ids)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self._index
+
+    def _rows_for(self, item_ids: Optional[Iterable[str]], active_only: bool) -> np.ndarray:
+        size = len(self._item_ids)
+        if item_ids is None:
+            rows = np.arange(size)
+        else:
+            rows = np.array(sorted(self._index[i] for i in item_ids if i in self._index), dtype=np.int64)
+        if active_only and len(rows):
+            rows = rows[self._stock[rows] > 0]
+        return rows
+
+    def _stamp_time(self, X: np.ndarray, now: datetime) -> np.ndarray:
+        values = {"year": now.year, "month": now.month, "day_of_week": now.weekday(), "hour": now.hour}
+        for name, value in values.items():
+            col = self._col.get(name)
+            if col is not None:
+                X[:, col] = value
+        return X
+
+    def matrix(self, now: datetime, item_ids: Optional[Iterable[str]] = None,
+               active_only: bool = True) -> Tuple[List[str], np.ndarray]:
+        """Return (item_ids, X) for the requested rows; X is a private copy"""
+        with self._lock:
+            rows = self._rows_for(item_ids, active_only)
+            X = self._matrix[rows]  # fancy indexing copies
+            ids = [self._item_ids[r] for r in rows]
+        return ids, self._stamp_time(X, now)
+
+    def row(self, item_id: str, now: datetime) -> Optional[np.ndarray]:
+        """Return a (1, n_features) matrix for one product, or None if unknown"""
+        with self._lock:
+            row = self._index.get(item_id)
+            if row is None:
+                return None
+            X = self._matrix[row:row + 1].copy()
+        return self._stamp_time(X, now)
+
+    def compose(self, items: List[Dict], now: datetime) -> np.ndarray:
+        """Encoded rows for caller-supplied items
+
+        Each item starts from its resident row (if unknown: zeros, with
+        categorical columns at UNKNOWN_CODE) and any raw feature values it
+        carries override that row's columns. A price without a price_bucket
+        re-derives the bucket. Raises ValueError for a non-numeric value in a
+        numeric column.
+        """
+        X = np.zeros((len(items), len(self.features)), dtype=np.float64)
+        categorical = [col for name, col in self._col.items() if name in self.lookups]
+        with self._lock:
+            for i, item in enumerate(items):
+                row = self._index.get(item.get("item_id"))
+                if row is not None:
+                    X[i] = self._matrix[row]
+                else:
+                    X[i, categorical] = UNKNOWN_CODE
+        self._stamp_time(X, now)
+        for i, item in enumerate(items):
+            overrides = dict(item)
+            if overrides.get("price") is not None and "price_bucket" not in overrides:
+                overrides["price_bucket"] = price_bucket_for(self._numeric(item, "price", overrides["price"]))
+            for name, value in overrides.items():
+                col = self._col.get(name)
+                if col is None:
+                    continue
+                if name not in self.lookups:
+                    value = self._numeric(item, name, value)
+                X[i, col] = self.encode_value(name, value)
+        return X
+
+    @staticmethod
+    def _numeric(item: Dict, name: str, value) -> float:
+        try:
+            return float(value or 0)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} of item {item.get('item_id')} must be numeric, got {value!r}")
+
+    def info(self, item_id: str) -> Optional[Dict]:
+        """Display fields for a product (a dict replaced, never mutated, on writes)"""
+        with self._lock:
+            row = self._index.get(item_id)
+            return self._info[row] if row is not None else None
+
+    def unscored(self, active_only: bool = True) -> List[str]:
+        """Item ids whose rows have no model score yet"""
+        with self._lock:
+            rows = self._rows_for(None, active_only)
+            rows = rows[np.isnan(self._scores[rows])]
+            return [self._item_ids[r] for r in rows]
+
+    def scored(self, active_only: bool = True) -> Tuple[List[str], np.ndarray]:
+        """Return (item_ids, raw_scores) for every scored row"""
+        with self._lock:
+            rows = self._rows_for(None, active_only)
+            scores = self._scores[rows]
+            keep = ~np.isnan(scores)
+            rows, scores = rows[keep], scores[keep]
+            return [self._item_ids[r] for r in rows], scores
+
+    def clear_scores(self) -> None:
+        """Forget all cached model scores"""
+        with self._lock:
+            self._scores[:] = np.nan
+
+
+# Process-wide store, configured by load_ml_artifacts
+feature_store = FeatureStore()
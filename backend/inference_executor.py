@@ -0,0 +1,149 @@
+"""
+ReSight Inference Executor
+Runs model inference off the event loop: a thread pool for LightGBM (which
+releases the GIL) and an optional process pool for pandas/SHAP work
+"""
+
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class JobStats:
+    """Timing counters for one job name"""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_ms = 0.0
+        self.queue_ms = 0.0
+
+    def record(self, run_ms: float, queue_ms: float, ok: bool) -> None:
+        self.count += 1
+        self.errors += 0 if ok else 1
+        self.total_ms += run_ms
+        self.max_ms = max(self.max_ms, run_ms)
+        self.last_ms = run_ms
+        self.queue_ms += queue_ms
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "avgMs": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "maxMs": round(self.max_ms, 3),
+            "lastMs": round(self.last_ms, 3),
+            "avgQueueMs": round(self.queue_ms / self.count, 3) if self.count else 0.0,
+        }
+
+
+class InferenceExecutor:
+    """Bounded executor that ranking, explain and what-if paths submit work to"""
+
+    def __init__(self, threads: int = 4, max_concurrency: Optional[int] = None,
+                 processes: int = 0, process_initializer: Optional[Callable] = None,
+                 initargs: tuple = ()):
+        self.threads = threads
+        self.max_concurrency = max_concurrency or threads
+        self._threads = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="inference")
+        self._processes = None
+        if processes > 0:
+            self._processes = ProcessPoolExecutor(
+                max_workers=processes, initializer=process_initializer, initargs=initargs
+            )
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._stats: Dict[str, JobStats] = {}
+        self._stats_lock = threading.Lock()
+        self._inflight = 0
+
+    @property
+    def has_process_pool(self) -> bool:
+        return self._processes is not None
+
+    async def run(self, job: str, fn: Callable, *args, cpu_bound: bool = False, **kwargs):
+        """Run fn(*args, **kwargs) on a worker and await the result
+
+        cpu_bound jobs go to the process pool when one is configured; fn and
+        its arguments must then be picklable.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        pool = self._processes if (cpu_bound and self._processes) else self._threads
+        call = functools.partial(fn, *args, **kwargs)
+
+        queued = time.perf_counter()
+        async with self._semaphore:
+            started = time.perf_counter()
+            self._inflight += 1
+            ok = False
+            try:
+                result = await asyncio.get_running_loop().run_in_executor(pool, call)
+                ok = True
+                return result
+            finally:
+                self._inflight -= 1
+                self._record(job, (time.perf_counter() - started) * 1000, (started - queued) * 1000, ok)
+
+    def _record(self, job: str, run_ms: float, queue_ms: float, ok: bool) -> None:
+        with self._stats_lock:
+            self._stats.setdefault(job, JobStats()).record(run_ms, queue_ms, ok)
+
+    def stats(self) -> Dict:
+        """Per-job timings plus pool configuration"""
+        with self._stats_lock:
+            jobs = {name: s.to_dict() for name, s in self._stats.items()}
+        return {
+            "threads": self.threads,
+            "processPool": self.has_process_pool,
+            "maxConcurrency": self.max_concurrency,
+            "inflight": self._inflight,
+            "jobs": jobs,
+        }
+
+    def shutdown(self) -> None:
+        self._threads.shutdown(wait=False, cancel_futures=True)
+        if self._processes:
+            self._processes.shutdown(wait=False, cancel_futures=True)
+
+
+# Process-pool worker state: each worker loads its own copy of the ranker
+
+_worker_model = None
+_worker_explainer = None
+_worker_version: Optional[int] = None  # Model version the worker's ranker belongs to
+
+
+class StaleArtifactsError(RuntimeError):
+    """The artifact files no longer match the model version a job asked for"""
+
+
+def worker_shap_values(X, version: int, source: str, fingerprint: tuple):
+    """Compute SHAP values inside a process-pool worker with model `version`
+
+    A worker holding another version reloads the ranker from source, provided
+    the files there are still the ones that version was loaded from;
+    otherwise StaleArtifactsError is raised and the caller explains in-process.
+    """
+    global _worker_model, _worker_explainer, _worker_version
+    if _worker_version != version:
+        import joblib
+        from model_registry import artifact_fingerprint
+        if artifact_fingerprint(source) != fingerprint:
+            raise StaleArtifactsError(f"Artifacts in {source} changed since model version {version} was loaded")
+        model = joblib.load(os.path.join(source, "lightgbm_ranker.pkl"))
+        if artifact_fingerprint(source) != fingerprint:
+            raise StaleArtifactsError(f"Artifacts in {source} changed while loading model version {version}")
+        _worker_model, _worker_explainer, _worker_version = model, None, version
+    if _worker_explainer is None:
+        import shap
+        _worker_explainer = shap.TreeExplainer(_worker_model)
+    return _worker_explainer.shap_values(X)
@@ -131,6 +131,7 @@ def seed_sample_data():
     print("Generating sample events...")
     for product_data in sample_products:
         item_id = product_data["item_id"]
+        events = []
         
         # Generate events for last 30 days
         for day in range(30):
@@ -139,7 +140,7 @@ def seed_sample_data():
             # Views
             views_count = random.randint(100, 5000)
             for _ in range(min(views_count, 100)):  # Limit individual inserts
-                data_api.record_event({
+                events.append({
                     "user_id": f"user_{random.randint(1, 1000)}",
                     "item_id": item_id,
                     "event_type": EventType.VIEW,
@@ -150,7 +151,7 @@ def seed_sample_data():
             # Clicks
             clicks_count = random.randint(10, 500)
             for _ in range(min(clicks_count, 50)):
-                data_api.record_event({
+                events.append({
                     "user_id": f"user_{random.randint(1, 1000)}",
                     "item_id": item_id,
                     "event_type": EventType.CLICK,
@@ -163,7 +164,7 @@ def seed_sample_data():
             price = product_data["price"]
             for _ in range(min(purchases_count, 20)):
                 quantity = random.randint(1, 3)
-                data_api.record_event({
+                events.append({
                     "user_id": f"user_{random.randint(1, 1000)}",
                     "item_id": item_id,
                     "event_type": EventType.PURCHASE,
@@ -172,6 +173,9 @@ def seed_sample_data():
                     "timestamp": date,
                     "region": "IN",
                 })
+        
+        # One bulk insert per product instead of a commit per event
+        data_api.record_events(events)
     
     print("[OK] Database seeded with sample data")
     print(f"[OK] Created {len(sample_products)} products")
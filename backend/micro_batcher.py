@@ -0,0 +1,84 @@
+"""
+ReSight Micro-Batcher
+Merges feature rows from concurrent /rank calls arriving within a few
+milliseconds into one model call and splits the scores back per caller
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Collects (X, future) pairs and scores them together"""
+
+    def __init__(self, score_fn: Callable[[np.ndarray], Awaitable[np.ndarray]],
+                 window_ms: float = 5, max_batch: int = 2048):
+        self._score_fn = score_fn
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._pending: List[Tuple[np.ndarray, asyncio.Future]] = []
+        self._pending_rows = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Batches in flight; the loop only keeps weak references to tasks
+        self._tasks: Set[asyncio.Task] = set()
+        # Metrics
+        self.requests_total = 0
+        self.batches_total = 0
+        self.rows_total = 0
+
+    async def score(self, X: np.ndarray) -> np.ndarray:
+        """Score X (n_rows, n_features) as part of the next batch"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((X, future))
+        self._pending_rows += len(X)
+        self.requests_total += 1
+
+        if self._pending_rows >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending, self._pending_rows = self._pending, [], 0
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[np.ndarray, asyncio.Future]]) -> None:
+        sizes = [len(X) for X, _ in batch]
+        self.batches_total += 1
+        self.rows_total += sum(sizes)
+        try:
+            scores = np.asarray(await self._score_fn(np.vstack([X for X, _ in batch])))
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        offset = 0
+        for (_, future), size in zip(batch, sizes):
+            if not future.done():
+                future.set_result(scores[offset:offset + size])
+            offset += size
+
+    def stats(self) -> Dict:
+        return {
+            "requests": self.requests_total,
+            "batches": self.batches_total,
+            "rows": self.rows_total,
+            "avgRequestsPerBatch": round(self.requests_total / self.batches_total, 2) if self.batches_total else 0.0,
+            "windowMs": self.window * 1000,
+            "maxBatch": self.max_batch,
+        }
@@ -6,9 +6,8 @@ Generates realistic marketplace events when no stores are connected
 import asyncio
 import random
 from datetime import datetime
-from sqlalchemy.orm import Session
-from database import SessionLocal, Product, Event, EventType, Store
-from retail_data_api import RetailDataAPI
+from database import AsyncSessionLocal, Product, Event, EventType, Store
+from retail_data_api import AsyncRetailDataAPI, RetailDataAPI
 import logging
 
 logger = logging.getLogger(__name__)
@@ -19,15 +18,23 @@ async def mock_event_generator():
     Background job: Generate mock marketplace events
     Runs only when no stores are connected (store.connected == False)
     """
-    db = SessionLocal()
-    data_api = RetailDataAPI(db)
-    
+    async with AsyncSessionLocal() as db:
+        await generate_mock_events(db, AsyncRetailDataAPI(db))
+
+
+def count_connected_stores(data_api: RetailDataAPI) -> int:
+    """Stores that are active or receiving webhooks"""
+    return data_api.db.query(Store).filter(
+        (Store.is_active == True) | (Store.connected == True)
+    ).count()
+
+
+async def generate_mock_events(db, data_api: AsyncRetailDataAPI):
+    """Event loop of the mock generator (async session, does not block webhooks)"""
     while True:
         try:
             # Check if any store is connected (either is_active or connected flag)
-            connected_stores = db.query(Store).filter(
-                (Store.is_active == True) | (Store.connected == True)
-            ).count()
+            connected_stores = await data_api.run_sync(count_connected_stores)
             
             # Only run mock generator if no stores connected
             if connected_stores > 0:
@@ -36,7 +43,7 @@ async def mock_event_generator():
                 continue
             
             # Get random product
-            products = data_api.get_all_products(active_only=True)
+            products = await data_api.get_all_products(active_only=True)
             if not products:
                 logger.warning("No products found for mock generation")
                 await asyncio.sleep(30)
@@ -60,9 +67,7 @@ async def mock_event_generator():
                 revenue = product.price * quantity
                 
                 # Update stock
-                product.stock = max(0, product.stock - quantity)
-                db.commit()
-                db.refresh(product)
+                await data_api.decrement_stock(product, quantity)
             
             # Record event
             event_data = {
@@ -75,13 +80,13 @@ async def mock_event_generator():
                 "revenue": revenue,
             }
             
-            data_api.record_event(event_data)
+            await data_api.record_events([event_data])
             
             # Trigger ranking recalculation
             await trigger_ranking_recalc(db, data_api)
             
             # Log mock event
-            data_api.log_audit(
+            await data_api.log_audit(
                 action="mock_event_generated",
                 entity_type="event",
                 entity_id=product.item_id,
@@ -95,13 +100,14 @@ async def mock_event_generator():
             
         except Exception as e:
             logger.error(f"Error in mock event generator: {e}")
+            await db.rollback()
             await asyncio.sleep(10)
 
 
-async def trigger_ranking_recalc(db: Session, data_api: RetailDataAPI):
+async def trigger_ranking_recalc(db, data_api: AsyncRetailDataAPI):
     """
-    Trigger immediate ranking recalculation after event
-    This ensures real-time updates to dashboard
+    Signal a ranking recalculation after event
+    The scheduler coalesces it with any other pending signals
     """
     try:
         # Import from app module (avoid circular dependency)
@@ -111,8 +117,8 @@ async def trigger_ranking_recalc(db: Session, data_api: RetailDataAPI):
             logger.warning("Model not loaded, skipping recalculation")
             return
         
-        # Call recalculation with database session
-        await app.recalc_rankings_with_db(db, data_api)
+        # Signal the recalculation scheduler
+        app.recalc_scheduler.signal()
         
     except Exception as e:
         logger.error(f"Error triggering ranking recalculation: {e}")
@@ -0,0 +1,149 @@
+"""
+ReSight Model Registry
+Versioned ML artifact sets (ranker, encoders, feature list) so a retrained
+model can be loaded and warmed aside, swapped in atomically and rolled back
+"""
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import joblib
+import logging
+
+from encoding import compile_encoders
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_FILES = ("lightgbm_ranker.pkl", "encoders.pkl", "features.txt")
+
+
+def artifact_fingerprint(artifact_dir: str) -> Tuple:
+    """(name, size, mtime) of each artifact file; changes when a new model is shipped"""
+    fingerprint = []
+    for name in ARTIFACT_FILES:
+        try:
+            st = os.stat(os.path.join(artifact_dir, name))
+            fingerprint.append((name, st.st_size, st.st_mtime_ns))
+        except FileNotFoundError:
+            fingerprint.append((name, None, None))
+    return tuple(fingerprint)
+
+
+@dataclass
+class ModelArtifacts:
+    """One loaded artifact set; fields other than explainer are never reassigned"""
+    version: int
+    model: Any
+    predictor: Any
+    encoders: Dict
+    lookups: Dict
+    features: List[str]
+    source: str
+    fingerprint: Tuple = ()
+    loaded_at: float = field(default_factory=time.time)
+    explainer: Any = None
+    warmup: Dict = field(default_factory=dict)
+
+    def same_schema(self, other: Optional["ModelArtifacts"]) -> bool:
+        """True when feature store rows encoded for other are valid for this set"""
+        if other is None or self.features != other.features:
+            return False
+        if self.lookups.keys() != other.lookups.keys():
+            return False
+        return all(
+            list(self.lookups[name].classes) == list(other.lookups[name].classes)
+            for name in self.lookups
+        )
+
+    def describe(self) -> Dict:
+        return {
+            "version": self.version,
+            "source": self.source,
+            "loadedAt": self.loaded_at,
+            "features": len(self.features),
+            "predictor": type(self.predictor).__name__,
+            "warmup": self.warmup,
+        }
+
+
+def read_artifacts(artifact_dir: str) -> Tuple[Any, Dict, Dict, List[str]]:
+    """Load (model, encoders, lookups, features) from an artifact directory"""
+    model_path = os.path.join(artifact_dir, "lightgbm_ranker.pkl")
+    model = joblib.load(model_path)
+    logger.info(f"[OK] Loaded model from {model_path}")
+
+    encoders_path = os.path.join(artifact_dir, "encoders.pkl")
+    encoders = joblib.load(encoders_path)
+    lookups = compile_encoders(encoders)
+    logger.info(f"[OK] Loaded encoders from {encoders_path}")
+
+    features_path = os.path.join(artifact_dir, "features.txt")
+    with open(features_path, "r") as f:
+        features = [line.strip() for line in f.readlines() if line.strip()]
+    logger.info(f"[OK] Loaded {len(features)} features from {features_path}")
+
+    return model, encoders, lookups, features
+
+
+class ModelRegistry:
+    """Holds the active artifact set and the one it replaced"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._current: Optional[ModelArtifacts] = None
+        self._previous: Optional[ModelArtifacts] = None
+        self.reloads = 0
+        self.rollbacks = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+    def current(self) -> Optional[ModelArtifacts]:
+        return self._current
+
+    def previous(self) -> Optional[ModelArtifacts]:
+        return self._previous
+
+    def next_version(self) -> int:
+        with self._lock:
+            self._version += 1
+            return self._version
+
+    def activate(self, artifacts: ModelArtifacts) -> Optional[ModelArtifacts]:
+        """Make artifacts current; the replaced set is kept for rollback"""
+        with self._lock:
+            replaced, self._current = self._current, artifacts
+            if replaced is not None:
+                self._previous = replaced
+                self.reloads += 1
+        return replaced
+
+    def rollback(self) -> ModelArtifacts:
+        """Swap the previous set back in (the current one becomes previous)"""
+        with self._lock:
+            if self._previous is None:
+                raise LookupError("No previous model version to roll back to")
+            self._current, self._previous = self._previous, self._current
+            self.rollbacks += 1
+            return self._current
+
+    def record_failure(self, error: Exception) -> None:
+        self.failures += 1
+        self.last_error = str(error)
+
+    def stats(self) -> Dict:
+        return {
+            "current": self._current.describe() if self._current else None,
+            "previous": self._previous.describe() if self._previous else None,
+            "reloads": self.reloads,
+            "rollbacks": self.rollbacks,
+            "failures": self.failures,
+            "lastError": self.last_error,
+        }
+
+
+# Process-wide registry, populated by load_ml_artifacts / reload_model
+model_registry = ModelRegistry()
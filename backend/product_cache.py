@@ -0,0 +1,153 @@
+"""
+ReSight Product Cache
+Size-bounded, in-process LRU of immutable product snapshots keyed by item_id,
+filled on read by get_product_by_id and invalidated on product writes
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, fields
+from datetime import datetime
+from typing import Dict, Optional
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class StoreSnapshot:
+    """Store fields carried by a product snapshot"""
+    id: int
+    name: str
+    platform: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class ProductSnapshot:
+    """Read-only copy of a Product row (safe to share across sessions and threads)"""
+    id: int
+    item_id: str
+    title: str
+    category: str
+    main_category: Optional[str]
+    price: float
+    stock: int
+    store_id: int
+    region: Optional[str]
+    verified_purchase: Optional[float]
+    helpful_votes: Optional[int]
+    avg_rating: Optional[float]
+    rating_count: Optional[int]
+    popularity_bucket: Optional[str]
+    price_bucket: Optional[str]
+    image_url: Optional[str]
+    brand: Optional[str]
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+    store: Optional[StoreSnapshot] = None
+
+    @classmethod
+    def from_product(cls, product) -> "ProductSnapshot":
+        """Copy column values (and the store) out of a loaded Product"""
+        store = product.store
+        return cls(
+            **{f.name: getattr(product, f.name) for f in fields(cls) if f.name != "store"},
+            store=StoreSnapshot(
+                id=store.id,
+                name=store.name,
+                platform=store.platform.value if store.platform else None,
+            ) if store else None,
+        )
+
+    def to_dict(self) -> Dict:
+        """Same shape as Product.to_dict"""
+        return {
+            "item_id": self.item_id,
+            "title": self.title,
+            "category": self.category,
+            "main_category": self.main_category,
+            "price": self.price,
+            "stock": self.stock,
+            "store": self.store.name if self.store else None,
+            "region": self.region,
+            "verified_purchase": self.verified_purchase,
+            "helpful_votes": self.helpful_votes,
+            "avg_rating": self.avg_rating,
+            "rating_count": self.rating_count,
+            "popularity_bucket": self.popularity_bucket,
+            "price_bucket": self.price_bucket,
+            "image_url": self.image_url,
+            "brand": self.brand,
+        }
+
+
+class ProductCache:
+    """Thread-safe LRU of ProductSnapshot; max_size 0 disables caching"""
+
+    def __init__(self, max_size: int = 10_000):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, ProductSnapshot]" = OrderedDict()
+        # Bumped on every invalidation; a fill that started before one is discarded
+        self._version = 0
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def get(self, item_id: str) -> Optional[ProductSnapshot]:
+        with self._lock:
+            snapshot = self._entries.get(item_id)
+            if snapshot is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(item_id)
+            self.hits += 1
+            return snapshot
+
+    def put(self, snapshot: ProductSnapshot, version: int) -> None:
+        """Store a snapshot read at cache version `version` (dropped if anything was invalidated since)"""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if version != self._version:
+                return
+            self._entries[snapshot.item_id] = snapshot
+            self._entries.move_to_end(snapshot.item_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, item_id: str) -> None:
+        with self._lock:
+            self._version += 1
+            self._entries.pop(item_id, None)
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxSize": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+# Process-wide cache; each API process keeps its own copy
+product_cache = ProductCache(max_size=int(os.getenv("PRODUCT_CACHE_SIZE", "10000")))
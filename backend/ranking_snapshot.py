@@ -0,0 +1,107 @@
+"""
+ReSight Ranking Snapshots
+Each recalculation publishes an immutable, versioned in-memory ranking that
+/rank, /item and the WebSocket broadcaster serve without a database round trip
+"""
+
+import threading
+import time
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class RankingSnapshot:
+    """One published ranking; never mutated after publish"""
+    version: int
+    created_at: float
+    items: Tuple[Mapping, ...] = ()
+    by_id: Mapping[str, Mapping] = field(default_factory=lambda: MappingProxyType({}))
+    kpis: Optional[Mapping] = None
+    # Rule-adjusted scores, ascending, for rank lookups by binary search;
+    # pinned rows are sorted by (pin priority, score), like apply_rules_to_scores
+    scores: np.ndarray = field(default_factory=lambda: np.empty(0))
+    pinned_scores: np.ndarray = field(default_factory=lambda: np.empty(0))
+    pin_priorities: np.ndarray = field(default_factory=lambda: np.empty(0))
+
+    @property
+    def age_seconds(self) -> float:
+        return time.time() - self.created_at
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def top(self, limit: Optional[int] = None) -> List[Dict]:
+        """Ranked rows as plain dicts (copies, safe to serialize or modify)"""
+        rows = self.items if limit is None else self.items[:limit]
+        return [dict(row) for row in rows]
+
+    def get(self, item_id: str) -> Optional[Mapping]:
+        return self.by_id.get(item_id)
+
+    def rank_of(self, score, pinned: bool = False, priority: float = 0.0, own: Optional[Mapping] = None):
+        """Exact rank(s) a row with the given rule-adjusted score(s) would take
+
+        Pinned rows rank ahead of all others, by pin priority and then score;
+        the rows ahead are counted by binary search. own is the row's current
+        snapshot row when it is already ranked, so it is not counted against itself.
+        """
+        score = np.asarray(score, dtype=np.float64)
+        if pinned:
+            # Pins of a higher priority, plus higher scores among equal priority
+            lo = np.searchsorted(self.pin_priorities, priority, side="left")
+            hi = np.searchsorted(self.pin_priorities, priority, side="right")
+            higher = len(self.pinned_scores) - lo - np.searchsorted(self.pinned_scores[lo:hi], score, side="right")
+        else:
+            higher = len(self.pinned_scores) + len(self.scores) - np.searchsorted(self.scores, score, side="right")
+        if own is not None:
+            higher = higher - self._ahead(own, score, pinned, priority)
+        ranks = higher + 1
+        return ranks.astype(np.int64) if ranks.ndim else int(ranks)
+
+    @staticmethod
+    def _ahead(row: Mapping, score: np.ndarray, pinned: bool, priority: float):
+        """Whether the snapshot row ranks ahead of (pinned, priority, score)"""
+        row_pinned = bool(row.get("pinned"))
+        if row_pinned != pinned:
+            return row_pinned
+        if pinned and row.get("pin_priority", 0.0) != priority:
+            return row.get("pin_priority", 0.0) > priority
+        return row["score"] > score
+
+
+class SnapshotStore:
+    """Holds the current snapshot; a new one is built aside and swapped in atomically"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._current = RankingSnapshot(version=0, created_at=time.time())
+
+    def current(self) -> RankingSnapshot:
+        return self._current
+
+    def publish(self, items: List[Dict], kpis: Optional[Dict] = None) -> RankingSnapshot:
+        """Freeze the ranked rows into a new snapshot and make it current"""
+        frozen = tuple(MappingProxyType(dict(item)) for item in items)
+        by_id = MappingProxyType({row["item_id"]: row for row in frozen})
+        kpis = MappingProxyType(dict(kpis)) if kpis is not None else None
+        pinned = np.fromiter((bool(row.get("pinned")) for row in frozen), dtype=bool, count=len(frozen))
+        scores = np.fromiter((row["score"] for row in frozen), dtype=np.float64, count=len(frozen))
+        priorities = np.fromiter((row.get("pin_priority", 0.0) for row in frozen), dtype=np.float64, count=len(frozen))
+        pin_order = np.lexsort((scores[pinned], priorities[pinned]))
+        groups = np.sort(scores[~pinned]), scores[pinned][pin_order], priorities[pinned][pin_order]
+        for group in groups:
+            group.setflags(write=False)
+        with self._lock:
+            self._version += 1
+            snapshot = RankingSnapshot(self._version, time.time(), frozen, by_id, kpis, *groups)
+            self._current = snapshot
+        return snapshot
+
+
+# Process-wide snapshot store, published by recalc_rankings_with_db
+ranking_snapshots = SnapshotStore()
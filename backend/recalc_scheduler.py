@@ -0,0 +1,121 @@
+"""
+ReSight Recalculation Scheduler
+Coalesces bursts of ranking-recalculation signals (webhooks, mock events)
+into a single pass and guarantees at most one recalculation runs at a time
+"""
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RecalcScheduler:
+    """Debounced, single-flight runner for recalc_rankings_with_db"""
+
+    def __init__(self, recalc: Callable[[bool], Awaitable[None]], window_ms: float = 250):
+        self._recalc = recalc
+        self.window = window_ms / 1000.0
+        self._event: Optional[asyncio.Event] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pending = 0
+        self._pending_full = False
+        # Metrics
+        self.signals_total = 0
+        self.runs_total = 0
+        self.scheduled_runs_total = 0
+        self.scheduled_signals_total = 0  # Signals served by scheduled passes
+        self.absorbed_signals_total = 0   # Signals served by run_now passes
+        self.failures_total = 0
+        self.last_run_ms = 0.0
+        self.last_run_at: Optional[float] = None
+
+    def start(self) -> None:
+        """Start the scheduler loop on the running event loop"""
+        self._event = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._loop())
+        logger.info(f"[OK] Recalc scheduler started ({self.window * 1000:.0f} ms window)")
+
+    async def stop(self) -> None:
+        """Cancel the loop; signals still pending are dropped"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def signal(self, full: bool = False) -> None:
+        """Request a recalculation; returns immediately"""
+        self.signals_total += 1
+        self._pending += 1
+        self._pending_full = self._pending_full or full
+        if self._event is not None:
+            self._event.set()
+
+    async def run_now(self, full: bool = False) -> None:
+        """Run a recalculation immediately (waits for one in flight), absorbing pending signals"""
+        if self._lock is None:
+            await self._recalc(full)
+            return
+        async with self._lock:
+            full = full or self._pending_full
+            self.absorbed_signals_total += self._pending
+            self._pending = 0
+            self._pending_full = False
+            if self._event is not None:
+                self._event.clear()
+            await self._execute(full)
+
+    async def _loop(self) -> None:
+        while True:
+            await self._event.wait()
+            # Let the burst accumulate before taking the batch
+            await asyncio.sleep(self.window)
+            async with self._lock:
+                if not self._pending:
+                    self._event.clear()
+                    continue
+                full = self._pending_full
+                self.scheduled_signals_total += self._pending
+                self._pending = 0
+                self._pending_full = False
+                self._event.clear()
+                self.scheduled_runs_total += 1
+                try:
+                    await self._execute(full)
+                except Exception as e:
+                    logger.error(f"Scheduled ranking recalculation failed: {e}")
+
+    async def _execute(self, full: bool) -> None:
+        start = time.perf_counter()
+        try:
+            await self._recalc(full)
+        except Exception:
+            self.failures_total += 1
+            raise
+        finally:
+            self.runs_total += 1
+            self.last_run_ms = (time.perf_counter() - start) * 1000
+            self.last_run_at = time.time()
+
+    def stats(self) -> Dict:
+        """Scheduler metrics for the /metrics/recalc endpoint"""
+        return {
+            "queueDepth": self._pending,
+            "signals": self.signals_total,
+            "absorbedSignals": self.absorbed_signals_total,
+            "runs": self.runs_total,
+            "failures": self.failures_total,
+            # Signals per scheduled pass (those absorbed by run_now passes are counted separately)
+            "coalescingRatio": round(self.scheduled_signals_total / self.scheduled_runs_total, 2) if self.scheduled_runs_total else 0.0,
+            "windowMs": self.window * 1000,
+            "running": bool(self._lock and self._lock.locked()),
+            "lastRunMs": round(self.last_run_ms, 2),
+            "lastRunAgeSeconds": round(time.time() - self.last_run_at, 2) if self.last_run_at else None,
+        }
@@ -4,17 +4,125 @@ Core data access layer for all marketplace integrations and ML operations
 """
 
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, desc, and_, or_, delete, exists, insert, literal, select, update
+from sqlalchemy.dialects import postgresql, sqlite
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional
+import numpy as np
 from database import (
-    Product, Store, Event, Rule, AuditLog, MLScore,
+    Product, Store, Event, EventRollup, Rule, AuditLog, MLScore,
     EventType, RuleType, StorePlatform
 )
+from audit_sink import audit_sink
+from dirty_tracker import dirty_items
+from product_cache import ProductSnapshot, product_cache
+from rule_engine import compile_rules
+from rules_index import RuleEntry, rules_index
+from feature_store import feature_store
+from rollups import history_version, hour_bucket, record_rollups
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Item ids per IN (...) list when aggregating event metrics (stays under SQLite's bound-parameter limit)
+METRICS_BATCH_SIZE = 500
+
+# KPI windows for get_global_kpis; changes compare against the window before
+KPI_WINDOWS = {
+    "24h": timedelta(hours=24),
+    "7d": timedelta(days=7),
+    "30d": timedelta(days=30),
+}
+
+# (window, hour tick, rollup history version) -> closed-hour period totals
+_period_totals_cache: Dict[tuple, Dict] = {}
+
+# ml_scores rows as this process last committed them: item_id -> (score, rank, previous_rank).
+# update_ml_scores writes only rows that differ; empty (startup, after a failed write) = full write
+_ml_scores_written: Dict[str, tuple] = {}
+
+# INSERT ... ON CONFLICT constructs for dialects that support upserts
+UPSERT_DIALECTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def score_buckets(scores: np.ndarray, buckets: int) -> np.ndarray:
+    """Equal-width score bucket of each score; bucket 0 holds the highest scores"""
+    if not len(scores):
+        return np.zeros(0, dtype=np.int64)
+    lo, hi = float(scores.min()), float(scores.max())
+    if hi == lo:
+        return np.zeros(len(scores), dtype=np.int64)
+    return np.minimum(((hi - scores) / (hi - lo) * buckets).astype(np.int64), buckets - 1)
+
+
+def bucket_ranks(scores: np.ndarray, first_rank: int, buckets: int,
+                 bucket: Optional[np.ndarray] = None) -> np.ndarray:
+    """Approximate ranks in O(n): equal-width score buckets, one shared rank per bucket"""
+    if bucket is None:
+        bucket = score_buckets(scores, buckets)
+    counts = np.bincount(bucket, minlength=buckets)
+    before = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    return first_rank + before[bucket]
+
+
+def rank_items(items: List[Dict], first_rank: int = 1, top_k: Optional[int] = None,
+               tail_buckets: int = 100) -> List[Dict]:
+    """Order items by score (descending) and set item["rank"]
+
+    With top_k, only the best top_k items are selected (argpartition) and
+    sorted exactly; the rest get bucketed ranks from bucket_ranks and are
+    returned grouped by bucket.
+    """
+    if not top_k or len(items) <= top_k:
+        items.sort(key=lambda x: x["score"], reverse=True)
+        for rank, item in enumerate(items, start=first_rank):
+            item["rank"] = rank
+        return items
+    
+    scores = np.fromiter((item["score"] for item in items), dtype=np.float64, count=len(items))
+    head = np.argpartition(-scores, top_k - 1)[:top_k]
+    head = head[np.argsort(-scores[head], kind="stable")]
+    tail_mask = np.ones(len(items), dtype=bool)
+    tail_mask[head] = False
+    tail = np.flatnonzero(tail_mask)
+    
+    bucket = score_buckets(scores[tail], tail_buckets)
+    tail_ranks = bucket_ranks(scores[tail], first_rank + top_k, tail_buckets, bucket)
+    # Ranks follow bucket order; NumPy's stable sort is a radix sort only for
+    # 16-bit keys, which bucket indices fit (absolute ranks may not)
+    key = bucket.astype(np.int16) if tail_buckets <= np.iinfo(np.int16).max else bucket
+    order = np.argsort(key, kind="stable")
+    
+    ranked = []
+    for rank, idx in enumerate(head, start=first_rank):
+        items[idx]["rank"] = rank
+        ranked.append(items[idx])
+    for pos in order:
+        item = items[tail[pos]]
+        item["rank"] = int(tail_ranks[pos])
+        ranked.append(item)
+    return ranked
+
+
+def percent_change(current: float, previous: float) -> float:
+    """Change vs the prior period in percent (0.0 when there is no prior activity)"""
+    if not previous:
+        return 0.0
+    return round((current - previous) / previous * 100, 1)
+
+
+def metrics_from_counts(views: int, clicks: int, purchases: int, revenue: float) -> Dict:
+    """Product metrics dict (with CTR and conversion) from event counts"""
+    return {
+        "views": views,
+        "clicks": clicks,
+        "purchases": purchases,
+        "revenue": revenue,
+        "ctr": (clicks / views * 100) if views > 0 else 0,
+        "conversion_rate": (purchases / clicks * 100) if clicks > 0 else 0,
+    }
+
 
 class RetailDataAPI:
     """Core data access layer for retail operations"""
@@ -31,9 +139,27 @@ class RetailDataAPI:
             query = query.filter(Product.stock > 0)
         return query.all()
     
-    def get_product_by_id(self, item_id: str) -> Optional[Product]:
-        """Get product by item_id"""
-        return self.db.query(Product).filter(Product.item_id == item_id).first()
+    def get_product_by_id(self, item_id: str) -> Optional[ProductSnapshot]:
+        """Get a read-only snapshot of a product (read-through product_cache)"""
+        snapshot = product_cache.get(item_id)
+        if snapshot is not None:
+            return snapshot
+        version = product_cache.version
+        product = self.db.query(Product).filter(Product.item_id == item_id).first()
+        if product is None:
+            return None
+        snapshot = ProductSnapshot.from_product(product)
+        product_cache.put(snapshot, version)
+        return snapshot
+    
+    def get_products_by_ids(self, item_ids: List[str], active_only: bool = True) -> List[Product]:
+        """Get the given products, optionally filtered by stock"""
+        if not item_ids:
+            return []
+        query = self.db.query(Product).filter(Product.item_id.in_(list(item_ids)))
+        if active_only:
+            query = query.filter(Product.stock > 0)
+        return query.all()
     
     def upsert_product(self, product_data: Dict) -> Product:
         """Create or update product from marketplace data"""
@@ -51,7 +177,26 @@ class RetailDataAPI:
             self.db.add(product)
         
         self.db.commit()
+        product_cache.invalidate(product.item_id)
         self.db.refresh(product)
+        feature_store.upsert(product)
+        dirty_items.mark(product.item_id)
+        return product
+    
+    def decrement_stock(self, product, quantity: int) -> Product:
+        """Reduce stock after an order and flag the product for re-scoring
+        
+        product may be a Product or a ProductSnapshot; the row is loaded
+        into this session and returned.
+        """
+        if not isinstance(product, Product):
+            product = self.db.query(Product).filter(Product.item_id == product.item_id).one()
+        product.stock = max(0, (product.stock or 0) - quantity)
+        self.db.commit()
+        product_cache.invalidate(product.item_id)
+        self.db.refresh(product)
+        feature_store.set_stock(product.item_id, product.stock)
+        dirty_items.mark(product.item_id)
         return product
     
     def get_products_by_category(self, category: str) -> List[Product]:
@@ -61,95 +206,275 @@ class RetailDataAPI:
     # Event Operations
     
     def record_event(self, event_data: Dict) -> Event:
-        """Record a user interaction event"""
+        """Record a user interaction event (and its hourly rollup, same transaction)"""
         event = Event(**event_data)
+        if event.timestamp is None:
+            event.timestamp = datetime.utcnow()
         self.db.add(event)
-        self.db.commit()
+        try:
+            record_rollups(self.db, [event])
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
         self.db.refresh(event)
         return event
     
+    def record_events(self, events: List[Dict]) -> int:
+        """Bulk-insert events and their rollups in one transaction
+        
+        One multi-row INSERT for all events; nothing is refreshed, so use
+        record_event when the stored Event object is needed. Returns the
+        number of events written.
+        """
+        if not events:
+            return 0
+        now = datetime.utcnow()
+        rows = [
+            {
+                "user_id": event_data.get("user_id"),
+                "item_id": event_data["item_id"],
+                "event_type": event_data["event_type"],
+                "quantity": event_data.get("quantity") if event_data.get("quantity") is not None else 1,
+                "timestamp": event_data.get("timestamp") or now,
+                "region": event_data.get("region") or "IN",
+                "revenue": event_data.get("revenue") or 0.0,
+            }
+            for event_data in events
+        ]
+        
+        try:
+            self.db.execute(insert(Event), rows)
+            record_rollups(self.db, rows)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return len(rows)
+    
     def get_product_metrics(self, item_id: str, days: int = 30) -> Dict:
         """Get aggregated metrics for a product"""
-        since = datetime.utcnow() - timedelta(days=days)
+        return self.get_products_metrics([item_id], days=days)[item_id]
+    
+    def get_products_metrics(self, item_ids: List[str], days: int = 30) -> Dict[str, Dict]:
+        """Aggregated metrics for many products, keyed by item_id
         
-        events = self.db.query(Event).filter(
-            and_(
-                Event.item_id == item_id,
-                Event.timestamp >= since
-            )
-        ).all()
+        Read from the hourly rollups (window starts at the top of the hour):
+        one GROUP BY (item_id, event_type) query per METRICS_BATCH_SIZE ids;
+        products without events get zeroed metrics. Counts are
+        quantity-weighted like get_event_totals, so per-product numbers add up
+        to the global KPIs.
+        """
+        since = hour_bucket(datetime.utcnow() - timedelta(days=days))
+        counts = {item_id: {} for item_id in item_ids}
+        revenue = dict.fromkeys(item_ids, 0)
         
-        views = sum(1 for e in events if e.event_type == EventType.VIEW)
-        clicks = sum(1 for e in events if e.event_type == EventType.CLICK)
-        purchases = sum(1 for e in events if e.event_type == EventType.PURCHASE)
-        revenue = sum(e.revenue for e in events if e.event_type == EventType.PURCHASE)
+        ids = list(counts)
+        for start in range(0, len(ids), METRICS_BATCH_SIZE):
+            rows = self.db.query(
+                EventRollup.item_id,
+                EventRollup.event_type,
+                func.sum(EventRollup.units),
+                func.sum(EventRollup.revenue),
+            ).filter(
+                and_(
+                    EventRollup.item_id.in_(ids[start:start + METRICS_BATCH_SIZE]),
+                    EventRollup.bucket >= since
+                )
+            ).group_by(EventRollup.item_id, EventRollup.event_type).all()
+            
+            for item_id, event_type, units, revenue_sum in rows:
+                counts[item_id][event_type] = int(units or 0)
+                if event_type == EventType.PURCHASE:
+                    revenue[item_id] = revenue_sum or 0
         
         return {
-            "views": views,
-            "clicks": clicks,
-            "purchases": purchases,
-            "revenue": revenue,
-            "ctr": (clicks / views * 100) if views > 0 else 0,
-            "conversion_rate": (purchases / clicks * 100) if clicks > 0 else 0,
+            item_id: metrics_from_counts(
+                views=by_type.get(EventType.VIEW, 0),
+                clicks=by_type.get(EventType.CLICK, 0),
+                purchases=by_type.get(EventType.PURCHASE, 0),
+                revenue=revenue[item_id],
+            )
+            for item_id, by_type in counts.items()
         }
     
-    def get_global_kpis(self) -> Dict:
-        """Compute global KPIs from events"""
-        since = datetime.utcnow() - timedelta(days=30)
+    def get_global_kpis(self, window: str = "30d") -> Dict:
+        """Compute global KPIs for a window (see KPI_WINDOWS) with changes vs the prior period
+        
+        Windows end with the current hour. Totals for closed hours of both
+        periods are cached until the next hour tick (or until late events
+        touch a closed hour); only the current hour is read on every call.
+        """
+        if window not in KPI_WINDOWS:
+            raise ValueError(f"Unknown KPI window {window!r}, expected one of {', '.join(KPI_WINDOWS)}")
         
-        # Get all events in the last 30 days
-        events = self.db.query(Event).filter(Event.timestamp >= since).all()
+        tick = hour_bucket(datetime.utcnow())
+        closed = self._closed_period_totals(window, tick)
+        live = self.get_event_totals(tick)
+        current = {key: closed["current"][key] + live[key] for key in live}
+        previous = closed["previous"]
         
-        views = sum(1 for e in events if e.event_type == EventType.VIEW)
-        clicks = sum(1 for e in events if e.event_type == EventType.CLICK)
-        purchases = sum(1 for e in events if e.event_type == EventType.PURCHASE)
-        revenue = sum(e.revenue for e in events if e.event_type == EventType.PURCHASE)
+        views = current["views"]
+        clicks = current["clicks"]
+        purchases = current["purchases"]
+        revenue = current["revenue"]
         
         # Get active products
         active_products = self.db.query(Product).filter(Product.stock > 0).count()
         
-        # Calculate changes (mock for now - in production, compare with previous period)
-        # TODO: Store historical KPIs for comparison
-        revenue_change = 0.0  # Would calculate from historical data
-        views_change = 0.0
-        clicks_change = 0.0
-        
         return {
+            "window": window,
             "revenue": revenue,
-            "revenueChange": revenue_change,
+            "revenueChange": percent_change(revenue, previous["revenue"]),
             "views": views,
-            "viewsChange": views_change,
+            "viewsChange": percent_change(views, previous["views"]),
             "clicks": clicks,
-            "clicksChange": clicks_change,
+            "clicksChange": percent_change(clicks, previous["clicks"]),
             "activeProducts": active_products,
             "avgOrderValue": revenue / purchases if purchases > 0 else 0,
         }
     
+    def _closed_period_totals(self, window: str, tick: datetime) -> Dict:
+        """Rollup totals for the closed hours of the current window and the whole prior window"""
+        key = (window, tick, history_version(self.db))
+        cached = _period_totals_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        span = KPI_WINDOWS[window]
+        start = tick + timedelta(hours=1) - span  # Current window: [start, tick + 1h)
+        totals = {
+            "current": self.get_event_totals(start, until=tick),
+            "previous": self.get_event_totals(start - span, until=start),
+        }
+        
+        # Entries for older ticks or history versions can never be hit again
+        for stale in [k for k in _period_totals_cache if k[1:] != key[1:]]:
+            _period_totals_cache.pop(stale, None)
+        _period_totals_cache[key] = totals
+        return totals
+    
+    def get_event_totals(self, since: datetime, until: Optional[datetime] = None) -> Dict:
+        """Quantity-weighted view/click/purchase totals and purchase revenue in [since, until)
+        
+        Summed from the hourly rollups (bounds round down to the hour), so the
+        cost does not grow with the event history. Marketplace webhooks report
+        batched counts in quantity, so each event counts quantity times.
+        """
+        query = self.db.query(
+            EventRollup.event_type,
+            func.sum(EventRollup.units),
+            func.sum(EventRollup.revenue),
+        ).filter(EventRollup.bucket >= hour_bucket(since))
+        if until is not None:
+            query = query.filter(EventRollup.bucket < hour_bucket(until))
+        
+        by_type = {event_type: (units, revenue) for event_type, units, revenue in
+                   query.group_by(EventRollup.event_type).all()}
+        return {
+            "views": int(by_type.get(EventType.VIEW, (0, 0))[0] or 0),
+            "clicks": int(by_type.get(EventType.CLICK, (0, 0))[0] or 0),
+            "purchases": int(by_type.get(EventType.PURCHASE, (0, 0))[0] or 0),
+            "revenue": float(by_type.get(EventType.PURCHASE, (0, 0))[1] or 0),
+        }
+    
+    def get_category_revenue(self, days: int = 30, limit: Optional[int] = None) -> List[tuple]:
+        """(category, purchase revenue) over the last days, highest first, from the rollups"""
+        since = hour_bucket(datetime.utcnow() - timedelta(days=days))
+        revenue = func.sum(EventRollup.revenue)
+        query = self.db.query(
+            func.coalesce(Product.category, "Unknown"),
+            revenue,
+        ).join(
+            Product, EventRollup.item_id == Product.item_id
+        ).filter(
+            and_(
+                EventRollup.event_type == EventType.PURCHASE,
+                EventRollup.bucket >= since,
+                EventRollup.revenue > 0
+            )
+        ).group_by(Product.category).order_by(desc(revenue))
+        
+        if limit:
+            query = query.limit(limit)
+        return [(category, float(total)) for category, total in query.all()]
+    
     # ML Score Operations
     
     def update_ml_scores(self, scores: List[Dict]) -> None:
-        """Update cached ML scores (called every 30s by background job)"""
-        # Clear old scores
-        self.db.query(MLScore).delete()
-        
-        # Insert new scores with ranks
-        for rank, score_data in enumerate(scores, start=1):
-            # Get previous rank if exists
-            old_score = self.db.query(MLScore).filter(
-                MLScore.item_id == score_data["item_id"]
-            ).first()
-            previous_rank = old_score.rank if old_score else None
-            
-            ml_score = MLScore(
-                item_id=score_data["item_id"],
-                score=score_data["score"],
-                rank=rank,
-                previous_rank=previous_rank,
-                computed_at=datetime.utcnow()
-            )
-            self.db.add(ml_score)
+        """Update cached ML scores (called every 30s by background job)
         
-        self.db.commit()
+        Items carrying a "rank" (from apply_rules_to_scores) keep it; otherwise
+        the list position is used. Written as one bulk upsert plus one delete
+        in a single transaction; each row's rank before this pass becomes its
+        previous_rank, and items missing from scores are dropped.
+        
+        After the first pass only rows whose score, rank or previous_rank would
+        change are upserted (see _ml_scores_written), so a pass that moves a
+        few items writes a few rows; computed_at is when a row last changed.
+        """
+        computed_at = datetime.utcnow()
+        rows = [
+            {
+                "item_id": score_data["item_id"],
+                "score": float(score_data["score"]),
+                "rank": int(score_data.get("rank", rank)),
+                "computed_at": computed_at,
+            }
+            for rank, score_data in enumerate(scores, start=1)
+        ]
+        
+        try:
+            dialect = self.db.get_bind().dialect.name
+            if dialect in ("sqlite", "postgresql"):
+                upsert = UPSERT_DIALECTS[dialect](MLScore.__table__)
+                upsert = upsert.on_conflict_do_update(
+                    index_elements=[MLScore.item_id],
+                    set_={
+                        "score": upsert.excluded.score,
+                        "previous_rank": MLScore.__table__.c.rank,
+                        "rank": upsert.excluded.rank,
+                        "computed_at": upsert.excluded.computed_at,
+                    },
+                )
+                if _ml_scores_written:
+                    # Unchanged: same score and rank, and previous_rank already equals rank
+                    changed = [row for row in rows
+                               if _ml_scores_written.get(row["item_id"]) != (row["score"], row["rank"], row["rank"])]
+                    current = {row["item_id"] for row in rows}
+                    dropped = [item_id for item_id in _ml_scores_written if item_id not in current]
+                else:
+                    changed, dropped = rows, None
+                if changed:
+                    self.db.execute(upsert, changed)
+                if dropped is None:
+                    # Everything not stamped by this pass is no longer ranked
+                    self.db.execute(delete(MLScore).where(MLScore.computed_at != computed_at))
+                else:
+                    for start in range(0, len(dropped), METRICS_BATCH_SIZE):
+                        chunk = dropped[start:start + METRICS_BATCH_SIZE]
+                        self.db.execute(delete(MLScore).where(MLScore.item_id.in_(chunk)))
+                # Ledger once committed: unchanged rows keep their entry
+                written = {row["item_id"]: _ml_scores_written.get(row["item_id"]) for row in rows}
+                for row in changed:
+                    previous = written[row["item_id"]]
+                    written[row["item_id"]] = (row["score"], row["rank"], previous[1] if previous else None)
+            else:
+                # Portable path: read prior ranks in one query, then replace
+                previous = dict(self.db.query(MLScore.item_id, MLScore.rank).all())
+                for row in rows:
+                    row["previous_rank"] = previous.get(row["item_id"])
+                self.db.execute(delete(MLScore))
+                if rows:
+                    self.db.execute(insert(MLScore), rows)
+                written = {}
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            _ml_scores_written.clear()
+            raise
+        _ml_scores_written.clear()
+        _ml_scores_written.update(written)
     
     def get_product_ml_score(self, item_id: str) -> Optional[MLScore]:
         """Get cached ML score for a product"""
@@ -164,10 +489,12 @@ class RetailDataAPI:
         if limit:
             query = query.limit(limit)
         
+        ranked = query.all()
+        metrics_by_id = self.get_products_metrics([ml_score.item_id for ml_score, _ in ranked])
+        
         results = []
-        for ml_score, product in query.all():
-            # Get metrics
-            metrics = self.get_product_metrics(ml_score.item_id)
+        for ml_score, product in ranked:
+            metrics = metrics_by_id[ml_score.item_id]
             
             result = {
                 "item_id": product.item_id,
@@ -187,19 +514,14 @@ class RetailDataAPI:
     
     # Rules Operations
     
-    def get_active_rules(self, item_id: Optional[str] = None) -> List[Rule]:
-        """Get active rules, optionally filtered by item_id"""
-        query = self.db.query(Rule).filter(
-            or_(
-                Rule.expires_at.is_(None),
-                Rule.expires_at > datetime.utcnow()
-            )
-        )
-        
-        if item_id:
-            query = query.filter(Rule.item_id == item_id)
-        
-        return query.all()
+    def _load_rules_index(self) -> None:
+        if not rules_index.loaded:
+            rules_index.load(self.db.query(Rule).all())
+    
+    def get_active_rules(self, item_id: Optional[str] = None) -> List[RuleEntry]:
+        """Get active rules, optionally filtered by item_id (from the resident rules_index)"""
+        self._load_rules_index()
+        return rules_index.active(item_id)
     
     def create_rule(self, rule_data: Dict) -> Rule:
         """Create a new ranking rule"""
@@ -207,6 +529,86 @@ class RetailDataAPI:
         self.db.add(rule)
         self.db.commit()
         self.db.refresh(rule)
+        rules_index.add(rule)
+        return rule
+    
+    def create_rules_bulk(self, rule_type: RuleType, strength: float = 1.0,
+                          category: Optional[str] = None, item_ids: Optional[List[str]] = None,
+                          in_stock_only: bool = False, expires_at: Optional[datetime] = None,
+                          created_by: str = "system", update_existing: bool = False) -> List[int]:
+        """Create a rule of rule_type for every product in a category / item list (all products if neither)
+        
+        One INSERT ... SELECT over products, anti-joined against active rules
+        of the same type, so items that already have one are skipped and
+        repeating the call creates nothing. update_existing=True also sets
+        strength (and expires_at, when given) on those existing rules. Runs in one
+        transaction; returns the ids of the rules created.
+        """
+        now = datetime.utcnow()
+        targets = select(Product.item_id)
+        if category is not None:
+            targets = targets.where(Product.category == category)
+        if item_ids is not None:
+            targets = targets.where(Product.item_id.in_(list(item_ids)))
+        if in_stock_only:
+            targets = targets.where(Product.stock > 0)
+        active_rule = and_(
+            Rule.rule_type == rule_type,
+            or_(Rule.expires_at.is_(None), Rule.expires_at > now),
+        )
+        
+        columns = ["item_id", "rule_type", "strength", "expires_at", "created_at", "created_by"]
+        missing = targets.add_columns(
+            literal(rule_type, Rule.rule_type.type),
+            literal(strength, Rule.strength.type),
+            literal(expires_at, Rule.expires_at.type),
+            literal(now, Rule.created_at.type),
+            literal(created_by, Rule.created_by.type),
+        ).where(~exists().where(Rule.item_id == Product.item_id, active_rule))
+        stmt = insert(Rule).from_select(columns, missing)
+        
+        rule_columns = (Rule.id, Rule.item_id, Rule.category, Rule.rule_type, Rule.strength,
+                        Rule.expires_at, Rule.created_at, Rule.created_by)
+        
+        try:
+            # Rows for the rules index (plain rows, so nothing reloads after commit)
+            changed = []
+            if update_existing:
+                # Before the insert, so only pre-existing rules are touched
+                existing = and_(active_rule, Rule.item_id.in_(targets))
+                # A call without expires_at keeps each rule's own expiry
+                values = {"strength": strength}
+                if expires_at is not None:
+                    values["expires_at"] = expires_at
+                self.db.execute(update(Rule).where(existing).values(**values))
+                changed.extend(self.db.execute(select(*rule_columns).where(existing)).all())
+            
+            if self.db.get_bind(clause=stmt).dialect.insert_returning:
+                created = self.db.execute(stmt.returning(*rule_columns)).all()
+            else:
+                self.db.execute(stmt)
+                created = self.db.execute(
+                    select(*rule_columns).where(Rule.created_at == now, Rule.rule_type == rule_type,
+                                                Rule.created_by == created_by)
+                ).all()
+            changed.extend(created)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        
+        rules_index.add_many(changed)
+        return [row.id for row in created]
+    
+    def update_rule(self, rule_id: int, values: Dict) -> Optional[Rule]:
+        """Set fields on an existing rule"""
+        rule = self.db.query(Rule).filter(Rule.id == rule_id).first()
+        if rule:
+            for key, value in values.items():
+                setattr(rule, key, value)
+            self.db.commit()
+            self.db.refresh(rule)
+            rules_index.add(rule)
         return rule
     
     def delete_rule(self, rule_id: int) -> bool:
@@ -215,77 +617,72 @@ class RetailDataAPI:
         if rule:
             self.db.delete(rule)
             self.db.commit()
+            rules_index.remove(rule_id)
             return True
         return False
     
-    def apply_rules_to_scores(self, scored_items: List[Dict]) -> List[Dict]:
-        """Apply business rules to ML scores"""
-        # Get all active rules
-        rules = self.get_active_rules()
+    def apply_rules_to_scores(self, scored_items: List[Dict], top_k: Optional[int] = None) -> List[Dict]:
+        """Apply business rules to ML scores
         
-        # Create lookup by item_id
-        rules_by_item = {}
-        category_rules = []
+        top_k enables partial ranking: pinned items plus the top_k best
+        unpinned items get exact ranks, the tail gets bucketed ranks.
+        """
+        # Active rules (resident index, no query) compiled into arrays aligned to scored_items
+        self._load_rules_index()
+        rules = rules_index.active()
+        item_ids = [item["item_id"] for item in scored_items]
+        categories = None
+        if any(rule.category for rule in rules):
+            categories = [
+                item.get("category") or (feature_store.info(item["item_id"]) or {}).get("category")
+                for item in scored_items
+            ]
+        compiled = compile_rules(rules, item_ids, categories)
         
-        for rule in rules:
-            if rule.item_id:
-                if rule.item_id not in rules_by_item:
-                    rules_by_item[rule.item_id] = []
-                rules_by_item[rule.item_id].append(rule)
+        scores = np.fromiter((item["score"] for item in scored_items), dtype=np.float64, count=len(scored_items))
+        adjusted = compiled.apply(scores)
+        for idx in np.flatnonzero(compiled.multiplier != 1.0):
+            scored_items[idx]["score"] = float(adjusted[idx])
         
-        # Apply rules
-        result = []
+        # Pinned items at the top (priority, then score), then rank the rest by score (descending)
         pinned_items = []
-        
-        for item in scored_items:
-            item_id = item["item_id"]
-            item_rules = rules_by_item.get(item_id, [])
-            
-            # Check for remove rule
-            if any(r.rule_type == RuleType.REMOVE for r in item_rules):
-                continue  # Skip removed items
-            
-            # Apply boost/demote
-            for rule in item_rules:
-                if rule.rule_type == RuleType.BOOST:
-                    item["score"] *= rule.strength
-                elif rule.rule_type == RuleType.DEMOTE:
-                    item["score"] /= rule.strength
-            
-            # Handle pin
-            if any(r.rule_type == RuleType.PIN for r in item_rules):
-                pinned_items.append(item)
-            else:
-                result.append(item)
-        
-        # Sort by score (descending)
-        result.sort(key=lambda x: x["score"], reverse=True)
-        
-        # Put pinned items at top
-        pinned_items.sort(key=lambda x: x["score"], reverse=True)
-        final_result = pinned_items + result
-        
-        # Re-assign ranks
-        for rank, item in enumerate(final_result, start=1):
+        for rank, idx in enumerate(compiled.pinned_order(adjusted), start=1):
+            item = scored_items[idx]
             item["rank"] = rank
+            item["pinned"] = True
+            item["pin_priority"] = float(compiled.pin_priority[idx])
+            pinned_items.append(item)
+        result = [scored_items[idx] for idx in np.flatnonzero(~compiled.pinned & ~compiled.removed)]
+        result = rank_items(result, first_rank=len(pinned_items) + 1, top_k=top_k)
         
-        return final_result
+        return pinned_items + result
     
     # Audit Logging
     
     def log_audit(self, action: str, entity_type: str, entity_id: str = None,
                   old_value: str = None, new_value: str = None,
-                  user: str = None, details: str = None) -> AuditLog:
-        """Create an audit log entry"""
-        audit = AuditLog(
-            action=action,
-            entity_type=entity_type,
-            entity_id=entity_id,
-            old_value=old_value,
-            new_value=new_value,
-            user=user,
-            details=details
-        )
+                  user: str = None, details: str = None,
+                  sync: bool = False) -> Optional[AuditLog]:
+        """Create an audit log entry
+        
+        By default the entry is queued on the write-behind audit_sink and
+        None is returned. sync=True (or no running sink, or a full queue)
+        commits it in this session and returns the stored AuditLog.
+        """
+        entry = {
+            "timestamp": datetime.utcnow(),
+            "action": action,
+            "entity_type": entity_type,
+            "entity_id": entity_id,
+            "old_value": old_value,
+            "new_value": new_value,
+            "user": user,
+            "details": details,
+        }
+        if not sync and audit_sink.submit(entry):
+            return None
+        
+        audit = AuditLog(**entry)
         self.db.add(audit)
         self.db.commit()
         self.db.refresh(audit)
@@ -326,7 +723,108 @@ class RetailDataAPI:
         return product
     
     def record_marketplace_events(self, item_id: str, events: List[Dict]) -> None:
-        """Record multiple events from marketplace webhook"""
-        for event_data in events:
-            event_data["item_id"] = item_id
-            self.record_event(event_data)
+        """Record multiple events from marketplace webhook (one bulk insert, rollups included)"""
+        self.record_events([{**event_data, "item_id": item_id} for event_data in events])
+
+
+class AsyncRetailDataAPI:
+    """Async counterpart of RetailDataAPI for an AsyncSession
+    
+    Exposes every public RetailDataAPI method as a coroutine with the same
+    signature. Each call runs the sync implementation through
+    AsyncSession.run_sync, so the I/O goes through the async driver and the
+    event loop keeps serving other requests while it waits.
+    """
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def run_sync(self, fn: Callable, *args, **kwargs):
+        """Run fn(RetailDataAPI(session), *args, **kwargs) on this session"""
+        return await self.db.run_sync(lambda session: fn(RetailDataAPI(session), *args, **kwargs))
+    
+    async def get_all_products(self, active_only: bool = True) -> List[Product]:
+        return await self.run_sync(RetailDataAPI.get_all_products, active_only)
+    
+    async def get_product_by_id(self, item_id: str) -> Optional[ProductSnapshot]:
+        return await self.run_sync(RetailDataAPI.get_product_by_id, item_id)
+    
+    async def get_products_by_ids(self, item_ids: List[str], active_only: bool = True) -> List[Product]:
+        return await self.run_sync(RetailDataAPI.get_products_by_ids, item_ids, active_only)
+    
+    async def upsert_product(self, product_data: Dict) -> Product:
+        return await self.run_sync(RetailDataAPI.upsert_product, product_data)
+    
+    async def decrement_stock(self, product, quantity: int) -> Product:
+        return await self.run_sync(RetailDataAPI.decrement_stock, product, quantity)
+    
+    async def get_products_by_category(self, category: str) -> List[Product]:
+        return await self.run_sync(RetailDataAPI.get_products_by_category, category)
+    
+    async def record_event(self, event_data: Dict) -> Event:
+        return await self.run_sync(RetailDataAPI.record_event, event_data)
+    
+    async def record_events(self, events: List[Dict]) -> int:
+        return await self.run_sync(RetailDataAPI.record_events, events)
+    
+    async def get_product_metrics(self, item_id: str, days: int = 30) -> Dict:
+        return await self.run_sync(RetailDataAPI.get_product_metrics, item_id, days)
+    
+    async def get_products_metrics(self, item_ids: List[str], days: int = 30) -> Dict[str, Dict]:
+        return await self.run_sync(RetailDataAPI.get_products_metrics, item_ids, days)
+    
+    async def get_global_kpis(self, window: str = "30d") -> Dict:
+        return await self.run_sync(RetailDataAPI.get_global_kpis, window)
+    
+    async def get_event_totals(self, since: datetime, until: Optional[datetime] = None) -> Dict:
+        return await self.run_sync(RetailDataAPI.get_event_totals, since, until)
+    
+    async def get_category_revenue(self, days: int = 30, limit: Optional[int] = None) -> List[tuple]:
+        return await self.run_sync(RetailDataAPI.get_category_revenue, days, limit)
+    
+    async def update_ml_scores(self, scores: List[Dict]) -> None:
+        return await self.run_sync(RetailDataAPI.update_ml_scores, scores)
+    
+    async def get_product_ml_score(self, item_id: str) -> Optional[MLScore]:
+        return await self.run_sync(RetailDataAPI.get_product_ml_score, item_id)
+    
+    async def get_ranked_products(self, limit: Optional[int] = None) -> List[Dict]:
+        return await self.run_sync(RetailDataAPI.get_ranked_products, limit)
+    
+    async def get_active_rules(self, item_id: Optional[str] = None) -> List[RuleEntry]:
+        return await self.run_sync(RetailDataAPI.get_active_rules, item_id)
+    
+    async def create_rule(self, rule_data: Dict) -> Rule:
+        return await self.run_sync(RetailDataAPI.create_rule, rule_data)
+    
+    async def create_rules_bulk(self, rule_type: RuleType, strength: float = 1.0,
+                                category: Optional[str] = None, item_ids: Optional[List[str]] = None,
+                                in_stock_only: bool = False, expires_at: Optional[datetime] = None,
+                                created_by: str = "system", update_existing: bool = False) -> List[int]:
+        return await self.run_sync(RetailDataAPI.create_rules_bulk, rule_type, strength, category, item_ids,
+                                   in_stock_only, expires_at, created_by, update_existing)
+    
+    async def update_rule(self, rule_id: int, values: Dict) -> Optional[Rule]:
+        return await self.run_sync(RetailDataAPI.update_rule, rule_id, values)
+    
+    async def delete_rule(self, rule_id: int) -> bool:
+        return await self.run_sync(RetailDataAPI.delete_rule, rule_id)
+    
+    async def apply_rules_to_scores(self, scored_items: List[Dict], top_k: Optional[int] = None) -> List[Dict]:
+        return await self.run_sync(RetailDataAPI.apply_rules_to_scores, scored_items, top_k)
+    
+    async def log_audit(self, action: str, entity_type: str, entity_id: str = None,
+                        old_value: str = None, new_value: str = None,
+                        user: str = None, details: str = None,
+                        sync: bool = False) -> Optional[AuditLog]:
+        return await self.run_sync(RetailDataAPI.log_audit, action, entity_type, entity_id,
+                                   old_value, new_value, user, details, sync)
+    
+    async def get_audit_logs(self, limit: int = 100) -> List[AuditLog]:
+        return await self.run_sync(RetailDataAPI.get_audit_logs, limit)
+    
+    async def upsert_from_marketplace(self, store_name: str, platform: str, product_data: Dict) -> Product:
+        return await self.run_sync(RetailDataAPI.upsert_from_marketplace, store_name, platform, product_data)
+    
+    async def record_marketplace_events(self, item_id: str, events: List[Dict]) -> None:
+        return await self.run_sync(RetailDataAPI.record_marketplace_events, item_id, events)
@@ -0,0 +1,190 @@
+"""
+ReSight Event Rollups
+Hourly per-item / per-event-type / per-region counters and revenue kept in
+event_rollups_hourly, updated in the same transaction as each event insert
+
+Backfill existing events:  python rollups.py backfill [--days N]
+(the API does this automatically at startup when the rollups table is empty)
+"""
+
+import argparse
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Mapping, Optional
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+import logging
+
+from database import Event, EventRollup, RollupHistory
+
+logger = logging.getLogger(__name__)
+
+# INSERT ... ON CONFLICT constructs for dialects that support upserts
+_UPSERT_DIALECTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+_KEY = ("bucket", "item_id", "event_type", "region")
+
+
+def hour_bucket(ts: datetime) -> datetime:
+    """Start of the hour containing ts"""
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def rollup_rows(events: Iterable) -> List[Dict]:
+    """Fold events (Event objects, result rows or column dicts) into rollup increments"""
+    totals = defaultdict(lambda: [0, 0, 0.0])
+    for event in events:
+        if isinstance(event, Mapping):
+            timestamp, item_id, event_type, region, quantity, revenue = (
+                event["timestamp"], event["item_id"], event["event_type"],
+                event.get("region"), event.get("quantity"), event.get("revenue"),
+            )
+        else:
+            timestamp, item_id, event_type, region, quantity, revenue = (
+                event.timestamp, event.item_id, event.event_type,
+                event.region, event.quantity, event.revenue,
+            )
+        key = (hour_bucket(timestamp), item_id, event_type, region or "IN")
+        row = totals[key]
+        row[0] += 1
+        row[1] += quantity if quantity is not None else 1
+        row[2] += revenue or 0.0
+    return [
+        {**dict(zip(_KEY, key)), "events": events_n, "units": units, "revenue": revenue}
+        for key, (events_n, units, revenue) in totals.items()
+    ]
+
+
+def apply_rollups(db: Session, rows: List[Dict]) -> None:
+    """Add increments to the hourly counters inside the caller's transaction (no commit)"""
+    if not rows:
+        return
+    table = EventRollup.__table__
+    dialect = db.get_bind().dialect.name
+
+    if dialect in _UPSERT_DIALECTS:
+        stmt = _UPSERT_DIALECTS[dialect](table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c[name] for name in _KEY],
+            set_={
+                "events": table.c.events + stmt.excluded.events,
+                "units": table.c.units + stmt.excluded.units,
+                "revenue": table.c.revenue + stmt.excluded.revenue,
+            },
+        )
+        db.execute(stmt, rows)
+        return
+
+    # Portable path: increment existing counters, insert the rest
+    for row in rows:
+        key_match = [table.c[name] == row[name] for name in _KEY]
+        result = db.execute(
+            update(table).where(*key_match).values(
+                events=table.c.events + row["events"],
+                units=table.c.units + row["units"],
+                revenue=table.c.revenue + row["revenue"],
+            )
+        )
+        if result.rowcount == 0:
+            db.execute(insert(table), [row])
+
+
+def history_version(db: Session) -> int:
+    """Changes whenever an hour before the current one is modified
+
+    Kept in the database, so backfills and late events written by other
+    processes invalidate cached period totals too.
+    """
+    return db.execute(select(RollupHistory.version).where(RollupHistory.id == 1)).scalar() or 0
+
+
+def _touch_history(db: Session) -> None:
+    """Bump the history version inside the caller's transaction (no commit)"""
+    result = db.execute(
+        update(RollupHistory).where(RollupHistory.id == 1).values(version=RollupHistory.version + 1)
+    )
+    if result.rowcount == 0:
+        db.execute(insert(RollupHistory).values(id=1, version=1))
+
+
+def record_rollups(db: Session, events: Iterable) -> None:
+    """Fold freshly added events into the rollups (same transaction as the events)"""
+    rows = rollup_rows(events)
+    apply_rollups(db, rows)
+    current_hour = hour_bucket(datetime.utcnow())
+    if any(row["bucket"] < current_hour for row in rows):
+        _touch_history(db)
+
+
+def backfill_rollups(db: Session, since: Optional[datetime] = None, chunk_size: int = 50_000) -> int:
+    """Rebuild rollups from raw events (all history, or from the hour containing since)
+
+    Existing rollup rows in the range are replaced; runs as one transaction.
+    Returns the number of events folded in.
+    """
+    start = hour_bucket(since) if since else None
+    query = select(Event.timestamp, Event.item_id, Event.event_type, Event.region,
+                   Event.quantity, Event.revenue)
+    clear = delete(EventRollup)
+    if start is not None:
+        query = query.where(Event.timestamp >= start)
+        clear = clear.where(EventRollup.bucket >= start)
+
+    try:
+        db.execute(clear)
+        folded = 0
+        totals: Dict = {}
+        for chunk in db.execute(query.execution_options(yield_per=chunk_size)).partitions():
+            for row in rollup_rows(chunk):
+                key = tuple(row[name] for name in _KEY)
+                if key in totals:
+                    for field in ("events", "units", "revenue"):
+                        totals[key][field] += row[field]
+                else:
+                    totals[key] = row
+            folded += len(chunk)
+        rows = list(totals.values())
+        for offset in range(0, len(rows), chunk_size):
+            db.execute(insert(EventRollup.__table__), rows[offset:offset + chunk_size])
+        _touch_history(db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    logger.info(f"[OK] Backfilled {len(totals)} rollup rows from {folded} events")
+    return folded
+
+
+def backfill_if_empty(db: Session) -> int:
+    """Backfill all history when there are events but no rollups yet (first start after upgrading)"""
+    if db.execute(select(EventRollup.id).limit(1)).first() is not None:
+        return 0
+    if db.execute(select(Event.id).limit(1)).first() is None:
+        return 0
+    logger.info("Rollups are empty; backfilling from existing events...")
+    return backfill_rollups(db)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ReSight event rollups")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("backfill", help="Rebuild hourly rollups from the events table")
+    p.add_argument("--days", type=int, default=None, help="Only rebuild the last N days (default: everything)")
+    args = parser.parse_args()
+
+    from database import SessionLocal, init_db
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+    db = SessionLocal()
+    try:
+        since = datetime.utcnow() - timedelta(days=args.days) if args.days else None
+        backfill_rollups(db, since=since)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
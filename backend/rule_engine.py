@@ -0,0 +1,125 @@
+"""
+ReSight Rule Engine
+Compiles business rules (pin / boost / demote / remove, per item or per
+category) into arrays aligned to a score vector - a multiplier, a removal
+mask and a pin priority - and ranks with a few NumPy operations
+
+NumPy only, so the Azure Functions recommend endpoint can share it.
+"""
+
+from typing import Iterable, Mapping, Optional, Sequence
+
+import numpy as np
+
+
+def _field(rule, name: str):
+    """Attribute of a Rule / RuleEntry, or key of a rule dict"""
+    if isinstance(rule, Mapping):
+        return rule.get(name)
+    return getattr(rule, name, None)
+
+
+def _rule_type(rule) -> str:
+    rule_type = _field(rule, "rule_type")
+    return str(getattr(rule_type, "value", rule_type)).lower()
+
+
+class RuleArrays:
+    """Per-position rule effects for n scored items"""
+
+    def __init__(self, n: int):
+        self.multiplier = np.ones(n, dtype=np.float64)
+        self.removed = np.zeros(n, dtype=bool)
+        self.pin_priority = np.zeros(n, dtype=np.float64)  # 0 = not pinned
+
+    def __len__(self) -> int:
+        return len(self.multiplier)
+
+    @property
+    def pinned(self) -> np.ndarray:
+        return self.pin_priority > 0
+
+    # Targets are a boolean mask or an array of positions (repeats compound)
+
+    def boost(self, targets, strength: float) -> None:
+        self._scale(targets, strength)
+
+    def demote(self, targets, strength: float) -> None:
+        self._scale(targets, 1.0 / strength if strength else 1.0)
+
+    def remove(self, targets) -> None:
+        self.removed[targets] = True
+
+    def pin(self, targets, priority: float = 1.0) -> None:
+        """Pinned items rank first, higher priority ahead, then by score"""
+        positions = self._positions(targets)
+        np.maximum.at(self.pin_priority, positions, priority if priority > 0 else 1.0)
+
+    def _scale(self, targets, factor) -> None:
+        np.multiply.at(self.multiplier, self._positions(targets), factor)
+
+    def _positions(self, targets) -> np.ndarray:
+        targets = np.asarray(targets)
+        return np.flatnonzero(targets) if targets.dtype == bool else targets.astype(np.intp)
+
+    def add_rules(self, rules: Iterable, item_ids: Sequence[str],
+                  categories: Optional[Sequence[Optional[str]]] = None) -> "RuleArrays":
+        """Fold Rule rows (or dicts with the same keys) into the arrays
+
+        Item rules hit the position of their item_id; category rules (no
+        item_id) hit every position whose category matches.
+        """
+        position = {item_id: i for i, item_id in enumerate(item_ids)}
+        category_array = np.asarray(categories, dtype=object) if categories is not None else None
+        positions, types, strengths = [], [], []
+        for rule in rules:
+            item_id = _field(rule, "item_id")
+            if item_id is not None:
+                if item_id not in position:
+                    continue
+                targets = np.array([position[item_id]], dtype=np.intp)
+            elif _field(rule, "category") is not None and category_array is not None:
+                targets = np.flatnonzero(category_array == _field(rule, "category"))
+            else:
+                continue
+            strength = _field(rule, "strength")
+            positions.append(targets)
+            types.append(np.full(len(targets), _rule_type(rule), dtype=object))
+            strengths.append(np.full(len(targets), 1.0 if strength is None else float(strength)))
+        if not positions:
+            return self
+
+        positions = np.concatenate(positions)
+        types = np.concatenate(types)
+        strengths = np.concatenate(strengths)
+
+        boost = types == "boost"
+        np.multiply.at(self.multiplier, positions[boost], strengths[boost])
+        demote = (types == "demote") & (strengths != 0)
+        np.divide.at(self.multiplier, positions[demote], strengths[demote])
+        self.removed[positions[types == "remove"]] = True
+        pin = types == "pin"
+        np.maximum.at(self.pin_priority, positions[pin], np.where(strengths[pin] > 0, strengths[pin], 1.0))
+        return self
+
+    def apply(self, scores) -> np.ndarray:
+        """Rule-adjusted scores (removed positions included)"""
+        return np.asarray(scores, dtype=np.float64) * self.multiplier
+
+    def pinned_order(self, adjusted: np.ndarray) -> np.ndarray:
+        """Positions of kept pinned items, by priority then adjusted score (descending)"""
+        pinned = np.flatnonzero(self.pinned & ~self.removed)
+        return pinned[np.lexsort((-adjusted[pinned], -self.pin_priority[pinned]))]
+
+    def order(self, scores) -> np.ndarray:
+        """Positions of kept items in final order: pinned first, then by adjusted score"""
+        adjusted = self.apply(scores)
+        rest = np.flatnonzero(~self.pinned & ~self.removed)
+        rest = rest[np.argsort(-adjusted[rest], kind="stable")]
+        return np.concatenate([self.pinned_order(adjusted), rest])
+
+
+def compile_rules(rules: Iterable, item_ids: Sequence[str],
+                  categories: Optional[Sequence[Optional[str]]] = None) -> RuleArrays:
+    """RuleArrays for rules over items in item_ids order"""
+    return RuleArrays(len(item_ids)).add_rules(rules, item_ids, categories)
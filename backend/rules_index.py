@@ -0,0 +1,241 @@
+"""
+ReSight Rules Index
+Resident copy of the ranking rules keyed by item_id and rule type, kept in
+step with create_rule / delete_rule, plus a hashed timer wheel that evicts
+rules at expires_at and reports the items whose ranking must be refreshed
+"""
+
+import math
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+import logging
+
+from database import RuleType
+
+logger = logging.getLogger(__name__)
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+@dataclass(frozen=True)
+class RuleEntry:
+    """Read-only copy of a Rule row"""
+    id: int
+    item_id: Optional[str]
+    rule_type: RuleType
+    strength: float
+    expires_at: Optional[datetime] = None
+    created_at: Optional[datetime] = None
+    created_by: Optional[str] = None
+    category: Optional[str] = None
+
+    @classmethod
+    def from_rule(cls, rule) -> "RuleEntry":
+        return cls(
+            id=rule.id,
+            item_id=rule.item_id,
+            rule_type=rule.rule_type,
+            strength=rule.strength if rule.strength is not None else 1.0,
+            expires_at=rule.expires_at,
+            created_at=rule.created_at,
+            created_by=rule.created_by,
+            category=rule.category,
+        )
+
+    @property
+    def key(self) -> str:
+        """item_id for item-scope rules, category for category-scope rules"""
+        return self.item_id if self.item_id is not None else self.category
+
+    def active(self, now: datetime) -> bool:
+        return self.expires_at is None or self.expires_at > now
+
+    def to_dict(self) -> Dict:
+        """Same shape as Rule.to_dict"""
+        return {
+            "id": self.id,
+            "item_id": self.item_id,
+            "category": self.category,
+            "rule_type": self.rule_type.value,
+            "strength": self.strength,
+            "expires_at": self.expires_at.isoformat() if self.expires_at else None,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "created_by": self.created_by,
+        }
+
+
+class TimerWheel:
+    """Hashed timer wheel of rule ids: `slots` buckets of `tick_seconds` each
+
+    Deadlines further out than one revolution stay in their bucket until the
+    cursor passes them on a later lap.
+    """
+
+    def __init__(self, tick_seconds: float = 1.0, slots: int = 3600):
+        self.tick = tick_seconds
+        self._slots: List[Set[int]] = [set() for _ in range(slots)]
+        self._deadlines: Dict[int, int] = {}
+        self._cursor: Optional[int] = None  # Last tick processed
+
+    def _tick_of(self, ts: datetime) -> int:
+        return math.ceil((ts - _EPOCH).total_seconds() / self.tick)
+
+    def schedule(self, key: int, deadline: datetime) -> None:
+        self.cancel(key)
+        tick = self._tick_of(deadline)
+        if self._cursor is not None and tick <= self._cursor:
+            tick = self._cursor + 1  # Already due: fire on the next advance
+        self._deadlines[key] = tick
+        self._slots[tick % len(self._slots)].add(key)
+
+    def cancel(self, key: int) -> None:
+        tick = self._deadlines.pop(key, None)
+        if tick is not None:
+            self._slots[tick % len(self._slots)].discard(key)
+
+    def advance(self, now: datetime) -> List[int]:
+        """Move the cursor to now; returns keys whose deadline has passed"""
+        target = math.floor((now - _EPOCH).total_seconds() / self.tick)
+        if self._cursor is None:
+            earliest = min(self._deadlines.values(), default=target)
+            self._cursor = min(earliest, target) - 1
+        if target <= self._cursor:
+            return []
+        # A gap longer than one revolution visits every bucket once
+        ticks = range(self._cursor + 1, target + 1)
+        if len(ticks) > len(self._slots):
+            ticks = range(target - len(self._slots) + 1, target + 1)
+        due = []
+        for tick in ticks:
+            bucket = self._slots[tick % len(self._slots)]
+            fired = [key for key in bucket if self._deadlines[key] <= target]
+            for key in fired:
+                bucket.discard(key)
+                del self._deadlines[key]
+            due.extend(fired)
+        self._cursor = target
+        return due
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+
+class RulesIndex:
+    """Thread-safe rules lookup: item_id (or category) -> rule type -> {rule_id: RuleEntry}"""
+
+    def __init__(self, tick_seconds: float = 1.0):
+        self.tick = tick_seconds
+        self._lock = threading.Lock()
+        self._by_item: Dict[str, Dict[RuleType, Dict[int, RuleEntry]]] = {}
+        self._by_category: Dict[str, Dict[RuleType, Dict[int, RuleEntry]]] = {}
+        self._by_id: Dict[int, RuleEntry] = {}
+        self._wheel = TimerWheel(tick_seconds=tick_seconds)
+        self.loaded = False
+        # Metrics
+        self.loads = 0
+        self.expired_total = 0
+
+    def load(self, rules: Iterable, now: Optional[datetime] = None) -> None:
+        """Replace the index with the given Rule rows (expired ones are skipped)"""
+        now = now or datetime.utcnow()
+        with self._lock:
+            self._by_item, self._by_category, self._by_id = {}, {}, {}
+            self._wheel = TimerWheel(tick_seconds=self.tick)
+            for rule in rules:
+                entry = RuleEntry.from_rule(rule)
+                if entry.active(now):
+                    self._insert(entry)
+            self.loaded = True
+            self.loads += 1
+        logger.info(f"[OK] Rules index loaded ({len(self._by_id)} active rules)")
+
+    def add(self, rule) -> RuleEntry:
+        entry = RuleEntry.from_rule(rule)
+        with self._lock:
+            if self.loaded:
+                self._remove(entry.id)
+                self._insert(entry)
+        return entry
+
+    def add_many(self, rules: Iterable) -> None:
+        entries = [RuleEntry.from_rule(rule) for rule in rules]
+        with self._lock:
+            if self.loaded:
+                for entry in entries:
+                    self._remove(entry.id)
+                    self._insert(entry)
+
+    def remove(self, rule_id: int) -> None:
+        with self._lock:
+            self._remove(rule_id)
+
+    def _insert(self, entry: RuleEntry) -> None:
+        self._by_id[entry.id] = entry
+        self._scope(entry).setdefault(entry.key, {}).setdefault(entry.rule_type, {})[entry.id] = entry
+        if entry.expires_at is not None:
+            self._wheel.schedule(entry.id, entry.expires_at)
+
+    def _remove(self, rule_id: int) -> Optional[RuleEntry]:
+        entry = self._by_id.pop(rule_id, None)
+        if entry is None:
+            return None
+        self._wheel.cancel(rule_id)
+        scope = self._scope(entry)
+        by_type = scope[entry.key]
+        del by_type[entry.rule_type][rule_id]
+        if not by_type[entry.rule_type]:
+            del by_type[entry.rule_type]
+        if not by_type:
+            del scope[entry.key]
+        return entry
+
+    def _scope(self, entry: RuleEntry) -> Dict:
+        return self._by_item if entry.item_id is not None else self._by_category
+
+    def expire(self, now: Optional[datetime] = None) -> List[RuleEntry]:
+        """Evict rules whose expires_at has passed; returns the evicted rules"""
+        now = now or datetime.utcnow()
+        with self._lock:
+            removed = [self._remove(rule_id) for rule_id in self._wheel.advance(now)]
+        removed = [entry for entry in removed if entry is not None]
+        self.expired_total += len(removed)
+        return removed
+
+    def active(self, item_id: Optional[str] = None, now: Optional[datetime] = None) -> List[RuleEntry]:
+        """Active rules (item and category scope), or the item-scope rules of one item"""
+        now = now or datetime.utcnow()
+        with self._lock:
+            if item_id is not None:
+                entries = [e for by_id in self._by_item.get(item_id, {}).values() for e in by_id.values()]
+            else:
+                entries = list(self._by_id.values())
+        return [e for e in entries if e.active(now)]
+
+    def for_item(self, item_id: str, category: Optional[str] = None,
+                 now: Optional[datetime] = None) -> List[RuleEntry]:
+        """Active rules that apply to one product: its own plus its category's"""
+        now = now or datetime.utcnow()
+        with self._lock:
+            entries = [e for by_id in self._by_item.get(item_id, {}).values() for e in by_id.values()]
+            if category is not None:
+                entries += [e for by_id in self._by_category.get(category, {}).values() for e in by_id.values()]
+        return [e for e in entries if e.active(now)]
+
+    def stats(self) -> Dict:
+        return {
+            "loaded": self.loaded,
+            "rules": len(self._by_id),
+            "items": len(self._by_item),
+            "categories": len(self._by_category),
+            "scheduledExpiries": len(self._wheel),
+            "expired": self.expired_total,
+            "loads": self.loads,
+        }
+
+
+# Process-wide index; loaded at startup (or on first use) and updated by the data API
+rules_index = RulesIndex(tick_seconds=float(os.getenv("RULES_EXPIRY_TICK_SECONDS", "1")))
@@ -0,0 +1,13 @@
+"""
+Azure Functions rule engine copy check (run from backend/: python -m pytest test_rule_engine_copy.py)
+"""
+
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent
+
+
+def test_functions_copy_matches_backend_rule_engine():
+    original = (BACKEND / "rule_engine.py").read_bytes()
+    copy = (BACKEND.parent / "functions" / "rules" / "rule_engine.py").read_bytes()
+    assert copy == original, "functions/rules/rule_engine.py differs from backend/rule_engine.py; copy it over"
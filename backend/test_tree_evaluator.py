@@ -0,0 +1,29 @@
+"""
+NumPy tree evaluator parity checks (run from backend/: python -m pytest test_tree_evaluator.py)
+"""
+
+import os
+
+import joblib
+import numpy as np
+import pytest
+
+from tree_evaluator import CompiledForest, check_parity, sample_inputs
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "azureml", "lightgbm_ranker.pkl")
+
+
+@pytest.fixture(scope="module")
+def model():
+    return joblib.load(MODEL_PATH)
+
+
+def test_compiled_forest_matches_lightgbm(model):
+    X = sample_inputs(model)
+    assert check_parity(CompiledForest.from_model(model), model, X) <= 1e-6
+
+
+def test_compiled_forest_matches_lightgbm_on_missing_values(model):
+    X = sample_inputs(model, seed=1)
+    X[np.random.default_rng(1).random(X.shape) < 0.2] = np.nan
+    assert check_parity(CompiledForest.from_model(model), model, X) <= 1e-6
@@ -0,0 +1,71 @@
+"""
+What-if rank checks (run from backend/: python -m pytest test_whatif.py)
+"""
+
+import asyncio
+import os
+import tempfile
+from types import SimpleNamespace
+
+import numpy as np
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/whatif_test.db")
+
+import app as app_module
+from ranking_snapshot import SnapshotStore
+from retail_data_api import rank_items
+
+
+def publish_catalog(size: int, top_k: int, seed: int = 0):
+    """Snapshot of `size` ranked items with exact ranks for the top_k only"""
+    rng = np.random.default_rng(seed)
+    items = [{"item_id": f"ITEM-{i}", "score": float(score)} for i, score in enumerate(rng.normal(size=size))]
+    return SnapshotStore().publish(rank_items(items, top_k=top_k))
+
+
+def whatif(monkeypatch, snapshot, item_id: str, prices, stock: int = 10, rules=()):
+    """whatif_price_ranks for one item whose model score does not depend on price"""
+    monkeypatch.setattr(app_module.ranking_snapshots, "current", lambda: snapshot)
+    monkeypatch.setattr(app_module.rules_index, "for_item", lambda item_id, category: list(rules))
+    monkeypatch.setattr(app_module, "price_variant_rows",
+                        lambda product, prices, now: np.zeros((len(prices) + 1, 1)))
+    monkeypatch.setattr(app_module, "predictor", SimpleNamespace(predict=lambda X: np.zeros(len(X))))
+    product = SimpleNamespace(item_id=item_id, category=None, stock=stock)
+    return asyncio.run(app_module.whatif_price_ranks(product, prices))
+
+
+def test_unchanged_price_on_tail_item_keeps_rank(monkeypatch):
+    snapshot = publish_catalog(5000, top_k=1000)
+    tail = [row for row in snapshot.items if row["rank"] > 1000][::250]
+    exact = {item_id: rank for rank, item_id in enumerate(
+        sorted(snapshot.by_id, key=lambda i: -snapshot.by_id[i]["score"]), start=1)}
+    for row in tail:
+        result = whatif(monkeypatch, snapshot, row["item_id"], [10.0])
+        assert result["oldRank"] == exact[row["item_id"]]
+        assert result["oldRank"] - int(result["ranks"][0]) == 0
+
+
+def test_unchanged_price_on_head_item_keeps_published_rank(monkeypatch):
+    snapshot = publish_catalog(5000, top_k=1000)
+    row = snapshot.items[10]
+    result = whatif(monkeypatch, snapshot, row["item_id"], [10.0])
+    assert result["oldRank"] == row["rank"] == int(result["ranks"][0])
+
+
+def test_out_of_stock_item_stays_unranked(monkeypatch):
+    snapshot = publish_catalog(100, top_k=1000)
+    result = whatif(monkeypatch, snapshot, "OUT-OF-STOCK", [10.0, 20.0], stock=0)
+    assert result["oldRank"] == len(snapshot) + 1
+    assert list(result["ranks"]) == [len(snapshot) + 1] * 2
+
+
+def test_pinned_item_ranks_by_pin_priority_first(monkeypatch):
+    rows = [
+        {"item_id": "PIN-HIGH", "score": 0.1, "rank": 1, "pinned": True, "pin_priority": 3.0},
+        {"item_id": "PIN-LOW", "score": 5.0, "rank": 2, "pinned": True, "pin_priority": 1.0},
+        {"item_id": "ITEM-0", "score": 9.0, "rank": 3},
+    ]
+    snapshot = SnapshotStore().publish(rows)
+    pin = SimpleNamespace(item_id="PIN-LOW", category=None, rule_type="pin", strength=1.0)
+    result = whatif(monkeypatch, snapshot, "PIN-LOW", [10.0], rules=[pin])
+    assert result["oldRank"] == int(result["ranks"][0]) == 2
@@ -0,0 +1,188 @@
+"""
+ReSight Compiled Tree Evaluator
+Pure-NumPy inference backend for the LightGBM ranker: the dumped tree
+structure is flattened into arrays and all trees are walked at once for a
+whole batch
+"""
+
+from typing import Dict
+
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# LightGBM missing_type codes
+MISSING_NONE, MISSING_ZERO, MISSING_NAN = 0, 1, 2
+_MISSING_TYPES = {"None": MISSING_NONE, "Zero": MISSING_ZERO, "NaN": MISSING_NAN}
+
+# Same tolerance LightGBM uses for "is zero"
+K_ZERO_THRESHOLD = 1e-35
+
+
+class CompiledForest:
+    """Flat-array forest; predict(X) matches LGBMRanker.predict (raw scores)
+
+    Nodes of all trees share one set of arrays. Leaves are stored as nodes
+    whose children point back at themselves (threshold +inf), so every row
+    can take max_depth steps through every tree without masking.
+    """
+
+    def __init__(self, feature, threshold, children, default_left, missing_type,
+                 value, roots, n_features: int, max_depth: int):
+        self.feature = np.asarray(feature, dtype=np.intp)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.children = np.asarray(children, dtype=np.intp).reshape(-1)  # [left, right] per node
+        self.default_left = np.asarray(default_left, dtype=bool)
+        self.missing_type = np.asarray(missing_type, dtype=np.int8)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.n_features = int(n_features)
+        self.max_depth = int(max_depth)
+        self._has_missing = bool(np.any(self.missing_type != MISSING_NONE))
+
+    @property
+    def num_trees(self) -> int:
+        return len(self.roots)
+
+    # Construction
+
+    @classmethod
+    def from_dump(cls, dump: Dict) -> "CompiledForest":
+        """Compile the output of Booster.dump_model()"""
+        if dump.get("num_tree_per_iteration", 1) != 1:
+            raise ValueError("Only single-output (ranking/regression) models are supported")
+        if dump.get("average_output"):
+            raise ValueError("Averaged-output (random forest) models are not supported")
+
+        feature, threshold, children, default_left, missing_type, value = [], [], [], [], [], []
+        roots = []
+        max_depth = 0
+
+        def new_node() -> int:
+            feature.append(0)
+            threshold.append(np.inf)
+            children.append([0, 0])
+            default_left.append(True)
+            missing_type.append(MISSING_NONE)
+            value.append(0.0)
+            return len(feature) - 1
+
+        def visit(node: Dict, depth: int) -> int:
+            nonlocal max_depth
+            max_depth = max(max_depth, depth)
+            idx = new_node()
+            if "split_feature" not in node:
+                value[idx] = node["leaf_value"]
+                children[idx] = [idx, idx]
+                return idx
+            if node.get("decision_type", "<=") != "<=":
+                raise ValueError("Categorical splits are not supported by the NumPy evaluator")
+            feature[idx] = node["split_feature"]
+            threshold[idx] = node["threshold"]
+            default_left[idx] = bool(node.get("default_left", True))
+            missing_type[idx] = _MISSING_TYPES[node.get("missing_type", "None")]
+            children[idx] = [visit(node["left_child"], depth + 1), visit(node["right_child"], depth + 1)]
+            return idx
+
+        for tree in dump["tree_info"]:
+            if tree.get("num_cat", 0):
+                raise ValueError("Categorical splits are not supported by the NumPy evaluator")
+            roots.append(visit(tree["tree_structure"], 0))
+
+        return cls(feature, threshold, children, default_left, missing_type,
+                   value, roots, dump["max_feature_idx"] + 1, max_depth)
+
+    @classmethod
+    def from_model(cls, model) -> "CompiledForest":
+        """Compile a fitted LGBMRanker / Booster"""
+        booster = getattr(model, "booster_", model)
+        return cls.from_dump(booster.dump_model())
+
+    def save(self, path: str) -> None:
+        """Persist the flat arrays (loadable without LightGBM installed)"""
+        np.savez_compressed(
+            path, feature=self.feature, threshold=self.threshold, children=self.children,
+            default_left=self.default_left, missing_type=self.missing_type,
+            value=self.value, roots=self.roots,
+            meta=np.array([self.n_features, self.max_depth]),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "CompiledForest":
+        data = np.load(path)
+        n_features, max_depth = data["meta"]
+        return cls(data["feature"], data["threshold"], data["children"], data["default_left"],
+                   data["missing_type"], data["value"], data["roots"], n_features, max_depth)
+
+    # Inference
+
+    def predict(self, X) -> np.ndarray:
+        """Sum of leaf values over all trees for every row of X"""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        n, n_cols = X.shape
+        if n_cols < self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got {n_cols}")
+        if not self._has_missing:
+            # missing_type None everywhere: NaN is treated as 0.0
+            X = np.nan_to_num(X, nan=0.0)
+
+        flat = X.ravel()
+        offsets = (np.arange(n, dtype=np.intp) * n_cols)[:, None]
+        node = np.broadcast_to(self.roots, (n, self.num_trees)).copy()
+        for _ in range(self.max_depth):
+            fval = flat[offsets + self.feature[node]]
+            go_right = ~self._goes_left(fval, node)
+            node = self.children[2 * node + go_right]
+
+        return self.value[node].sum(axis=1)
+
+    def _goes_left(self, fval: np.ndarray, node: np.ndarray) -> np.ndarray:
+        if not self._has_missing:
+            return fval <= self.threshold[node]
+        mtype = self.missing_type[node]
+        is_nan = np.isnan(fval)
+        fval = np.where(is_nan & (mtype != MISSING_NAN), 0.0, fval)
+        use_default = ((mtype == MISSING_ZERO) & (np.abs(fval) <= K_ZERO_THRESHOLD)) | \
+                      ((mtype == MISSING_NAN) & is_nan)
+        return np.where(use_default, self.default_left[node], fval <= self.threshold[node])
+
+
+def check_parity(forest: CompiledForest, model, X, tolerance: float = 1e-6) -> float:
+    """Max absolute difference against the LightGBM model; raises if above tolerance"""
+    expected = np.asarray(model.predict(X), dtype=np.float64)
+    actual = forest.predict(X)
+    diff = float(np.max(np.abs(expected - actual))) if len(expected) else 0.0
+    if diff > tolerance:
+        raise ValueError(f"NumPy evaluator diverges from LightGBM by {diff:.3g}")
+    return diff
+
+
+def sample_inputs(model, n: int = 256, seed: int = 0) -> np.ndarray:
+    """Random rows spanning each feature's training range (for parity checks)"""
+    booster = getattr(model, "booster_", model)
+    dump = booster.dump_model()
+    infos = dump.get("feature_infos", {})
+    rng = np.random.default_rng(seed)
+    cols = []
+    for name in dump["feature_names"]:
+        info = infos.get(name) or {}
+        low, high = info.get("min_value", 0.0), info.get("max_value", 1.0)
+        cols.append(rng.uniform(low - 1, high + 1, n))
+    return np.column_stack(cols)
+
+
+class HybridPredictor:
+    """NumPy evaluator for small batches, LightGBM for large ones"""
+
+    def __init__(self, forest: CompiledForest, model, max_batch: int = 8):
+        self.forest = forest
+        self.model = model
+        self.max_batch = max_batch
+
+    def predict(self, X) -> np.ndarray:
+        if len(X) <= self.max_batch:
+            return self.forest.predict(X)
+        return self.model.predict(X)
@@ -21,3 +21,33 @@ export const simulatePriceChange = async (
   });
   return res.data;
 };
+
+export interface PriceCurvePoint {
+  price: number;
+  score: number;
+  rank: number;
+  rankChange: number;
+}
+
+export interface PriceCurveResponse {
+  itemId: string;
+  currentPrice: number;
+  oldRank: number;
+  snapshotVersion: number;
+  curve: PriceCurvePoint[];
+}
+
+export const simulatePriceCurve = async (
+  itemId: string,
+  minPrice: number,
+  maxPrice: number,
+  points = 50
+): Promise<PriceCurveResponse> => {
+  const res = await axios.post(`${API}/whatif/price-curve`, {
+    itemId,
+    minPrice,
+    maxPrice,
+    points,
+  });
+  return res.data;
+};
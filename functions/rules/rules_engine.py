@@ -1,13 +1,35 @@
+import numpy as np
+
+# Same engine as backend/rule_engine.py, copied here because the Functions app
+# is deployed from functions/ alone; keep the two files identical
+# (backend/test_rule_engine_copy.py checks this)
+from rules.rule_engine import RuleArrays
+
+
 def apply_rules(df, rules):
+    arrays = RuleArrays(len(df))
+
     if rules.get("remove_out_of_stock"):
-        df = df[df["inventory"] > 0]
+        arrays.remove(df["inventory"].to_numpy() <= 0)
 
     if rules.get("boost_clearance"):
-        df.loc[df["clearance"] == 1, "score"] *= 1.2
+        arrays.boost(df["clearance"].to_numpy() == 1, 1.2)
 
     if "pin_item" in rules:
-        pinned = df[df["item_id"] == rules["pin_item"]]
-        df = df[df["item_id"] != rules["pin_item"]]
-        df = pd.concat([pinned, df])
+        arrays.pin(df["item_id"].to_numpy() == rules["pin_item"])
+
+    # Item / category rules in the backend's format: {"item_id" or "category", "rule_type", "strength"}
+    if rules.get("rules"):
+        categories = df["category"].tolist() if "category" in df else None
+        arrays.add_rules(rules["rules"], df["item_id"].tolist(), categories)
+
+    # Pinned items first (higher priority ahead), then the rest in the order Azure ML returned them
+    kept = ~arrays.removed
+    pinned = np.flatnonzero(arrays.pinned & kept)
+    pinned = pinned[np.argsort(-arrays.pin_priority[pinned], kind="stable")]
+    order = np.concatenate([pinned, np.flatnonzero(~arrays.pinned & kept)])
 
+    scores = df["score"].to_numpy()
+    df = df.iloc[order].copy()
+    df["score"] = arrays.apply(scores)[order]
     return df